@@ -1,6 +1,9 @@
 from django.contrib import admin
-from .models import Mosque, Imam, Schedule
+from .models import Mosque, Imam, Schedule, OutboxMessage, Delivery, BroadcastJob
 
 admin.site.register(Mosque)
 admin.site.register(Imam)
 admin.site.register(Schedule)
+admin.site.register(OutboxMessage)
+admin.site.register(Delivery)
+admin.site.register(BroadcastJob)
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import OutboxMessage
+
+
+# Statuses the worker is done with; 'failed' still has a retry scheduled
+FINISHED_STATUSES = {OutboxMessage.STATUS_SENT, OutboxMessage.STATUS_DEAD}
+
+
+def _poll_interval():
+    return getattr(settings, 'BROADCAST_POLL_INTERVAL', 2)
+
+
+def job_results(job_id):
+    """
+    Current state of every message of a broadcast job, in one query
+
+    Returns:
+        dict: {message id: {'id', 'name', 'status', 'label', 'reason', 'attempts'}}
+    """
+    labels = dict(OutboxMessage.STATUS_CHOICES)
+    rows = (
+        OutboxMessage.objects.filter(job_id=job_id)
+        .order_by('id')
+        .values_list('id', 'recipient_name', 'status', 'attempts', 'response')
+    )
+    return {
+        pk: {
+            'id': pk,
+            'name': name,
+            'status': status,
+            'label': labels.get(status, status),
+            'reason': '' if status == OutboxMessage.STATUS_SENT else response,
+            'attempts': attempts,
+        }
+        for pk, name, status, attempts, response in rows
+    }
+
+
+def job_totals(results):
+    """Counts per status plus 'total' and 'done' (nothing left for the worker)"""
+    totals = {status: 0 for status, _ in OutboxMessage.STATUS_CHOICES}
+    for result in results.values():
+        totals[result['status']] = totals.get(result['status'], 0) + 1
+    totals['total'] = len(results)
+    totals['done'] = all(result['status'] in FINISHED_STATUSES for result in results.values())
+    return totals
+
+
+def sse_event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def job_events(job_id, seen):
+    """
+    Events for the messages whose state changed since the last call
+
+    Args:
+        seen: {message id: (status, attempts)} already sent to this client,
+              updated in place; pass {} for a full snapshot
+
+    Returns:
+        tuple: (list of SSE event strings, totals dict)
+    """
+    results = job_results(job_id)
+    events = []
+    for pk, result in results.items():
+        state = (result['status'], result['attempts'])
+        if seen.get(pk) != state:
+            seen[pk] = state
+            events.append(sse_event('result', result))
+    return events, job_totals(results)
+
+
+def _retry_line():
+    # Tells EventSource how long to wait before reconnecting (milliseconds)
+    return f'retry: {int(_poll_interval() * 1000)}\n\n'
+
+
+def snapshot_events(job_id):
+    """
+    The whole current state once, for WSGI servers
+
+    The response ends straight away; the browser reconnects after
+    BROADCAST_POLL_INTERVAL and gets the next snapshot, until 'done'.
+    """
+    yield _retry_line()
+    events, totals = job_events(job_id, {})
+    yield from events
+    yield sse_event('totals', totals)
+    if totals['done']:
+        yield sse_event('done', totals)
+
+
+async def live_events(job_id):
+    """
+    Changes as they happen, for ASGI servers
+
+    Polls the database every BROADCAST_POLL_INTERVAL seconds and sends only
+    what changed; between polls nothing but the coroutine is held. After
+    BROADCAST_STREAM_TIMEOUT the stream ends and the browser reconnects,
+    so streams of closed tabs do not live on.
+    """
+    yield _retry_line()
+    deadline = time.monotonic() + getattr(settings, 'BROADCAST_STREAM_TIMEOUT', 300)
+    seen = {}
+    last_totals = None
+    while True:
+        events, totals = await sync_to_async(job_events)(job_id, seen)
+        for event in events:
+            yield event
+        if totals != last_totals:
+            last_totals = totals
+            yield sse_event('totals', totals)
+        if totals['done']:
+            yield sse_event('done', totals)
+            return
+        if time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(_poll_interval())
@@ -0,0 +1,139 @@
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Delivery
+
+
+# Keys are (schedule_id, target_date) pairs; every helper works on one kind
+
+CLAIM_CHUNK_SIZE = 500
+
+
+def _claim_timeout():
+    return timedelta(seconds=getattr(settings, 'DELIVERY_CLAIM_TIMEOUT', 600))
+
+
+def _retryable(now):
+    """Failed rows, and rows claimed by a run that died before sending or queueing them"""
+    return Q(status=Delivery.STATUS_FAILED) | Q(
+        status=Delivery.STATUS_PENDING, outbox__isnull=True, claimed_at__lt=now - _claim_timeout(),
+    )
+
+
+def delivered_keys(kind, target_dates):
+    """
+    Keys that must not be sent again: delivered, queued, or claimed by a live run
+
+    One query over the (kind, target_date, schedule) unique index, whatever
+    the number of schedules.
+
+    Returns:
+        set: (schedule_id, target_date) pairs
+    """
+    return set(
+        Delivery.objects.filter(kind=kind, target_date__in=set(target_dates))
+        .exclude(_retryable(timezone.now()))
+        .values_list('schedule_id', 'target_date')
+    )
+
+
+def claim(kind, keys):
+    """
+    Take ownership of the keys that still need sending
+
+    Missing rows are inserted and retryable ones re-claimed under a fresh
+    token; rows that another run inserted or claimed first are left alone,
+    so two runs racing each other never both send the same reminder.
+
+    Args:
+        kind: One of OutboxMessage.KIND_CHOICES
+        keys: Iterable of (schedule_id, target_date)
+
+    Returns:
+        dict: {(schedule_id, target_date): delivery id} for the keys claimed
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    dates = {target_date for _, target_date in keys}
+
+    with transaction.atomic():
+        Delivery.objects.bulk_create(
+            [
+                Delivery(kind=kind, schedule_id=schedule_id, target_date=target_date,
+                         claim_token=token, claimed_at=now)
+                for schedule_id, target_date in keys
+            ],
+            batch_size=CLAIM_CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+        for start in range(0, len(keys), CLAIM_CHUNK_SIZE):
+            schedules_by_date = defaultdict(list)
+            for schedule_id, target_date in keys[start:start + CLAIM_CHUNK_SIZE]:
+                schedules_by_date[target_date].append(schedule_id)
+            chunk = Q()
+            for target_date, schedule_ids in schedules_by_date.items():
+                chunk |= Q(target_date=target_date, schedule_id__in=schedule_ids)
+            Delivery.objects.filter(chunk, _retryable(now), kind=kind).update(
+                status=Delivery.STATUS_PENDING, claim_token=token, claimed_at=now, outbox=None,
+            )
+
+        return {
+            (schedule_id, target_date): pk
+            for pk, schedule_id, target_date in Delivery.objects.filter(
+                kind=kind, target_date__in=dates, claim_token=token,
+            ).values_list('id', 'schedule_id', 'target_date')
+        }
+
+
+def link_outbox(outbox_messages, delivery_ids):
+    """
+    Attach claimed deliveries to the outbox messages that carry them
+
+    Args:
+        outbox_messages: Saved OutboxMessage rows
+        delivery_ids: Parallel list; the delivery ids each message covers
+    """
+    rows = [
+        Delivery(id=pk, outbox_id=outbox_message.id)
+        for outbox_message, ids in zip(outbox_messages, delivery_ids)
+        for pk in ids
+    ]
+    Delivery.objects.bulk_update(rows, ['outbox'], batch_size=CLAIM_CHUNK_SIZE)
+
+
+def record_results(field, results):
+    """
+    Store send attempts on the deliveries
+
+    Rows sharing an outcome are updated together, so a batch costs one
+    UPDATE per distinct service response rather than one per row.
+
+    Args:
+        field: 'id' for delivery ids, 'outbox' for outbox message ids
+        results: Iterable of (id, new status, service response); failures
+                 the outbox will retry keep STATUS_PENDING
+    """
+    groups = defaultdict(list)
+    for value, status, response in results:
+        groups[(status, response or '')].append(value)
+
+    now = timezone.now()
+    for (status, response), values in groups.items():
+        changes = {'attempts': F('attempts') + 1, 'response': response, 'status': status}
+        if status == Delivery.STATUS_SENT:
+            changes['sent_at'] = now
+        Delivery.objects.filter(**{f'{field}__in': values}).update(**changes)
+
+
+def release(delivery_ids):
+    """Give back claims that were never attempted so the next run picks them up"""
+    Delivery.objects.filter(id__in=delivery_ids, status=Delivery.STATUS_PENDING).update(
+        status=Delivery.STATUS_FAILED, response='Not attempted',
+    )
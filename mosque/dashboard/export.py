@@ -0,0 +1,201 @@
+import csv
+import re
+import zipfile
+from itertools import chain
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from .hijri import week_dates
+from .models import Mosque, Imam, Schedule
+
+
+SCHEDULE_HEADER = [
+    'التاريخ', 'التاريخ الهجري', 'اليوم', 'وقت الصلاة',
+    'المسجد', 'عنوان المسجد', 'هاتف المسجد',
+    'الداعية', 'هاتف الداعية', 'ملاحظات',
+]
+CONTACT_HEADER = ['النوع', 'الاسم', 'الهاتف', 'البريد الإلكتروني', 'العنوان']
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def schedule_rows():
+    """
+    Yield one export row per schedule, ordered by weekday
+
+    Rows are fetched with .iterator() so only one chunk is held in memory.
+    Dates are resolved once per weekday, not per row.
+    """
+    week = week_dates()
+    dates = {weekday: (date.isoformat(), hijri_str) for weekday, (date, hijri_str) in week.items()}
+    weekdays = dict(Schedule.WEEKDAY_CHOICES)
+    prayer_times = dict(Schedule.PRAYER_TIME_CHOICES)
+
+    schedules = (
+        Schedule.objects.select_related('mosque', 'imam')
+        .order_by('weekday', 'id')
+        .iterator(chunk_size=_chunk_size())
+    )
+    for schedule in schedules:
+        date, hijri_str = dates[schedule.weekday]
+        yield (
+            date,
+            hijri_str,
+            weekdays[schedule.weekday],
+            prayer_times.get(schedule.prayer_time, schedule.prayer_time),
+            schedule.mosque.name,
+            schedule.mosque.address,
+            schedule.mosque.get_full_phone(),
+            schedule.imam.name,
+            schedule.imam.get_full_phone(),
+            schedule.notes,
+        )
+
+
+def contact_rows():
+    """Yield the name and phone number of every mosque, then every caller"""
+    for mosque in Mosque.objects.order_by('name', 'id').iterator(chunk_size=_chunk_size()):
+        yield ('مسجد', mosque.name, mosque.get_full_phone(), '', mosque.address)
+    for imam in Imam.objects.order_by('name', 'id').iterator(chunk_size=_chunk_size()):
+        yield ('داعية', imam.name, imam.get_full_phone(), imam.email or '', '')
+
+
+class _Echo:
+    """File-like object whose write() returns the data instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the UTF-8 (Arabic) text correctly
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _ZipStream:
+    """Write-only, unseekable target for ZipFile; drain() hands out what was written so far"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+_SHEET_START = (
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0" rightToLeft="1"/></sheetViews>'
+    '<sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+# Control characters are not allowed in XML 1.0
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_row(number, row):
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_INVALID_XML_CHARS.sub("", str(value)))}</t></is></c>'
+        for value in row
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+def stream_xlsx(header, rows, sheet_name='Sheet1'):
+    """
+    Generate an .xlsx workbook with a single sheet, piece by piece
+
+    The workbook is a zip archive written to an unseekable stream, so bytes
+    are handed out as rows are compressed instead of after the last row.
+    Cells are inline strings; no styles or shared string table.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, _XML_HEADER + content.format(sheet_name=escape(sheet_name)))
+        yield stream.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_XML_HEADER + _SHEET_START).encode())
+            for number, row in enumerate(chain([header], rows), start=1):
+                sheet.write(_xlsx_row(number, row).encode())
+                if number % 500 == 0:
+                    data = stream.drain()
+                    if data:
+                        yield data
+            sheet.write(_SHEET_END.encode())
+    yield stream.drain()
+
+
+def export_response(export_format, filename, header, rows, sheet_name='Sheet1'):
+    """
+    Stream rows as a CSV or XLSX download
+
+    Args:
+        export_format: 'csv' or 'xlsx' (anything else falls back to csv)
+        filename: Download name without extension
+        header: Column titles
+        rows: Iterable of row tuples; consumed lazily while the response is sent
+    """
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    content_type, extension = EXPORT_FORMATS[export_format]
+
+    if export_format == 'xlsx':
+        content = stream_xlsx(header, rows, sheet_name)
+    else:
+        content = stream_csv(header, rows)
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -34,3 +34,16 @@ class ScheduleForm(forms.ModelForm):
     class Meta:
         model = Schedule
         fields = ['mosque', 'imam', 'weekday', 'prayer_time', 'notes']
+
+
+class ImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('mosques', 'المساجد'),
+        ('imams', 'الدعاة'),
+        ('schedules', 'الجداول'),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label='نوع البيانات', widget=forms.Select(attrs={'class': 'form-select'}))
+    file = forms.FileField(label='ملف CSV (UTF-8)', widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}))
+    skip_invalid = forms.BooleanField(label='استيراد الصفوف الصحيحة وتجاهل الصفوف التي بها أخطاء', required=False, widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}))
+    dry_run = forms.BooleanField(label='تحقق فقط بدون حفظ', required=False, widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}))
@@ -0,0 +1,52 @@
+import datetime
+from functools import lru_cache
+from hijri_converter import Gregorian
+
+
+HIJRI_MONTHS = [
+    'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
+    'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
+]
+
+
+def model_weekday(date):
+    """Convert a date to the Schedule weekday numbering (0=Saturday ... 6=Friday)"""
+    return (date.weekday() + 2) % 7
+
+
+def _as_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    return date
+
+
+@lru_cache(maxsize=1024)
+def _hijri_date_str(date):
+    hijri_date = Gregorian(date.year, date.month, date.day).to_hijri()
+    hijri_month_name = HIJRI_MONTHS[hijri_date.month - 1]
+    return f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
+
+
+def hijri_date_str(date):
+    """
+    Format a Gregorian date as a Hijri date string, e.g. "5 رمضان 1447 هـ"
+
+    Results are memoized per calendar day, so callers inside loops pay for
+    the conversion once.
+    """
+    return _hijri_date_str(_as_date(date))
+
+
+def week_dates(start=None):
+    """
+    Resolve the next 7 days starting at `start` (default: today)
+
+    Returns:
+        dict: {weekday (0=Saturday): (date, hijri date string)}
+    """
+    start = _as_date(start) if start else datetime.date.today()
+    dates = {}
+    for offset in range(7):
+        date = start + datetime.timedelta(days=offset)
+        dates[model_weekday(date)] = (date, hijri_date_str(date))
+    return dates
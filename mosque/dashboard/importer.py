@@ -0,0 +1,298 @@
+import csv
+from dataclasses import dataclass, field
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .forms import MosqueForm, ImamForm
+from .models import Mosque, Imam, Schedule
+from .stats import invalidate_home_stats
+
+
+IMPORT_COLUMNS = {
+    'mosques': ['name', 'address', 'country_code', 'phone'],
+    'imams': ['name', 'country_code', 'phone', 'email'],
+    'schedules': ['mosque', 'imam', 'weekday', 'prayer_time', 'notes'],
+}
+REQUIRED_COLUMNS = {
+    'mosques': ['name', 'address'],
+    'imams': ['name', 'phone'],
+    'schedules': ['mosque', 'imam', 'weekday', 'prayer_time'],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+# Rows per bulk_update statement; each row adds parameters to every CASE
+UPDATE_BATCH_SIZE = 200
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+    rolled_back: bool = False
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+class ScheduleImportForm(forms.Form):
+    """Row validation for schedules; references are resolved against lookup maps, not per-row queries"""
+    mosque = forms.CharField(max_length=200)
+    imam = forms.CharField(max_length=200)
+    weekday = forms.TypedChoiceField(choices=Schedule.WEEKDAY_CHOICES, coerce=int)
+    prayer_time = forms.ChoiceField(choices=Schedule.PRAYER_TIME_CHOICES)
+    notes = forms.CharField(required=False)
+
+
+class RowValidator:
+    """
+    Validate rows with a form's fields without building a form per row
+
+    Instantiating a form deep-copies all of its fields, which dominates the
+    cost of validating tens of thousands of rows. For model forms the
+    model's own field validation (max_length, email, choices) runs too.
+    """
+
+    def __init__(self, form_class):
+        self.fields = form_class().fields
+        meta = getattr(form_class, '_meta', None)
+        self.model = meta.model if meta else None
+
+    def clean(self, row):
+        """
+        Returns:
+            tuple: (cleaned data, error message or None)
+        """
+        cleaned, errors = {}, {}
+        for name, form_field in self.fields.items():
+            try:
+                cleaned[name] = form_field.clean(row.get(name, ''))
+            except ValidationError as e:
+                errors[name] = e.messages
+
+        if not errors and self.model is not None:
+            try:
+                self.model(**cleaned).clean_fields()
+            except ValidationError as e:
+                errors.update(e.message_dict)
+
+        if errors:
+            return None, '; '.join(f'{name}: {" ".join(messages)}' for name, messages in errors.items())
+        return cleaned, None
+
+
+def _name_map(model):
+    """{name: id} for every row; names used by several rows map to None (ambiguous)"""
+    names = {}
+    for name, pk in model.objects.values_list('name', 'id').iterator(chunk_size=5000):
+        names[name] = None if name in names else pk
+    return names
+
+
+class _Importer:
+    model = None
+    form_class = None
+    update_fields = []
+
+    def __init__(self, result):
+        self.result = result
+        self.validator = RowValidator(self.form_class)
+        self.seen = {}  # key -> first line, to reject duplicates within the file
+
+    def clean(self, line, row):
+        """Return the cleaned row or None after recording the errors"""
+        data, error = self.validator.clean(self.prepare(row))
+        if error:
+            self.result.add_error(line, error)
+        return data
+
+    def prepare(self, row):
+        return row
+
+    def write(self, batch):
+        """Create or update one batch of (line, cleaned_data)"""
+        raise NotImplementedError
+
+
+class _ContactImporter(_Importer):
+    """Mosques and callers, matched to existing rows by name"""
+
+    def prepare(self, row):
+        row = dict(row)
+        if not row.get('country_code'):
+            row['country_code'] = '+966'
+        return row
+
+    def write(self, batch):
+        existing = {}
+        for instance in self.model.objects.filter(name__in={data['name'] for _, data in batch}):
+            existing.setdefault(instance.name, []).append(instance)
+
+        to_create, to_update = [], []
+        for line, data in batch:
+            if data['name'] in self.seen:
+                self.result.add_error(line, f"Duplicate of line {self.seen[data['name']]}")
+                continue
+            self.seen[data['name']] = line
+
+            matches = existing.get(data['name'], [])
+            if len(matches) > 1:
+                self.result.add_error(line, f"{len(matches)} existing rows are named \"{data['name']}\"; edit them in the dashboard")
+                continue
+            if matches:
+                instance = matches[0]
+                if all(getattr(instance, name) == data[name] for name in self.update_fields):
+                    self.result.unchanged += 1
+                    continue
+                for name in self.update_fields:
+                    setattr(instance, name, data[name])
+                to_update.append(instance)
+            else:
+                to_create.append(self.model(**data))
+
+        self.model.objects.bulk_create(to_create)
+        self.model.objects.bulk_update(to_update, self.update_fields, batch_size=UPDATE_BATCH_SIZE)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+
+
+class MosqueImporter(_ContactImporter):
+    model = Mosque
+    form_class = MosqueForm
+    update_fields = ['address', 'country_code', 'phone']
+
+
+class ImamImporter(_ContactImporter):
+    model = Imam
+    form_class = ImamForm
+    update_fields = ['country_code', 'phone', 'email']
+
+
+class ScheduleImporter(_Importer):
+    """
+    Schedules reference mosques and callers by name
+
+    Rows whose (mosque, weekday, prayer_time) already exist replace the
+    caller and notes of that schedule, keeping unique_together intact.
+    """
+    model = Schedule
+    form_class = ScheduleImportForm
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.mosques = _name_map(Mosque)
+        self.imams = _name_map(Imam)
+        self.weekdays = {label: str(value) for value, label in Schedule.WEEKDAY_CHOICES}
+        self.prayer_times = {label: code for code, label in Schedule.PRAYER_TIME_CHOICES}
+
+    def prepare(self, row):
+        # Accept the Arabic labels shown in the dashboard as well as the stored values
+        row = dict(row)
+        row['weekday'] = self.weekdays.get(row.get('weekday', ''), row.get('weekday', ''))
+        row['prayer_time'] = self.prayer_times.get(row.get('prayer_time', ''), row.get('prayer_time', ''))
+        return row
+
+    def resolve(self, line, lookup, name, label):
+        if name not in lookup:
+            self.result.add_error(line, f'{label} "{name}" does not exist')
+        elif lookup[name] is None:
+            self.result.add_error(line, f'Several {label.lower()}s are named "{name}"')
+        else:
+            return lookup[name]
+        return None
+
+    def write(self, batch):
+        rows = []
+        for line, data in batch:
+            mosque_id = self.resolve(line, self.mosques, data['mosque'], 'Mosque')
+            imam_id = self.resolve(line, self.imams, data['imam'], 'Caller')
+            if mosque_id is None or imam_id is None:
+                continue
+
+            key = (mosque_id, data['weekday'], data['prayer_time'])
+            if key in self.seen:
+                self.result.add_error(line, f'Duplicate of line {self.seen[key]} (same mosque, weekday and prayer time)')
+                continue
+            self.seen[key] = line
+            rows.append((key, imam_id, data['notes']))
+
+        existing = {
+            (mosque_id, weekday, prayer_time): (pk, imam_id, notes)
+            for pk, mosque_id, weekday, prayer_time, imam_id, notes in Schedule.objects.filter(
+                mosque_id__in={key[0] for key, _, _ in rows}
+            ).values_list('id', 'mosque_id', 'weekday', 'prayer_time', 'imam_id', 'notes')
+        }
+
+        to_create, to_update = [], []
+        for key, imam_id, notes in rows:
+            mosque_id, weekday, prayer_time = key
+            current = existing.get(key)
+            if current and current[1:] == (imam_id, notes):
+                self.result.unchanged += 1
+                continue
+            schedule = Schedule(
+                id=current[0] if current else None, mosque_id=mosque_id, imam_id=imam_id,
+                weekday=weekday, prayer_time=prayer_time, notes=notes,
+            )
+            (to_update if current else to_create).append(schedule)
+
+        Schedule.objects.bulk_create(to_create)
+        Schedule.objects.bulk_update(to_update, ['imam', 'notes'], batch_size=UPDATE_BATCH_SIZE)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+
+
+IMPORTERS = {
+    'mosques': MosqueImporter,
+    'imams': ImamImporter,
+    'schedules': ScheduleImporter,
+}
+
+
+def import_csv(kind, text_stream, skip_invalid=False, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import mosques, callers or schedules from CSV
+
+    The first line must name the columns in IMPORT_COLUMNS[kind]. Rows are
+    validated and written batch_size at a time inside one transaction.
+    Unless skip_invalid is set, any row error rolls the whole import back;
+    dry_run always rolls back.
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult()
+    reader = csv.DictReader(text_stream)
+    columns = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS[kind] if name not in columns]
+    if missing:
+        result.add_error(1, f'Missing column(s): {", ".join(missing)}')
+        result.rolled_back = True
+        return result
+    reader.fieldnames = columns
+
+    with transaction.atomic():
+        importer = IMPORTERS[kind](result)
+        batch = []
+        for line, row in enumerate(reader, start=2):
+            row = {name: (value or '').strip() for name, value in row.items() if name}
+            data = importer.clean(line, row)
+            if data is not None:
+                batch.append((line, data))
+            if len(batch) >= batch_size:
+                importer.write(batch)
+                batch = []
+        if batch:
+            importer.write(batch)
+
+        if dry_run or (result.errors and not skip_invalid):
+            transaction.set_rollback(True)
+            result.rolled_back = True
+
+    if not result.rolled_back and (result.created or result.updated):
+        # bulk_create/bulk_update do not send the signals that clear the cache
+        invalidate_home_stats()
+
+    result.errors.sort()
+    return result
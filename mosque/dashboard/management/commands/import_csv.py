@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.importer import import_csv, IMPORT_COLUMNS, DEFAULT_BATCH_SIZE
+import time
+
+
+class Command(BaseCommand):
+    help = 'Bulk import mosques, imams or schedules from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_COLUMNS), help='What the file contains')
+        parser.add_argument('path', help='CSV file (UTF-8, header row required)')
+        parser.add_argument(
+            '--skip-invalid',
+            action='store_true',
+            help='Import the valid rows even if some rows have errors (default: import nothing)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and report without saving anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows validated and written per batch (default: {DEFAULT_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as csv_file:
+                result = import_csv(
+                    options['kind'],
+                    csv_file,
+                    skip_invalid=options['skip_invalid'],
+                    dry_run=options['dry_run'],
+                    batch_size=max(1, options['batch_size']),
+                )
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["path"]}: {e}')
+        except UnicodeDecodeError:
+            raise CommandError(f'{options["path"]} is not UTF-8 encoded')
+
+        for line, message in result.errors:
+            self.stdout.write(self.style.ERROR(f'Line {line}: {message}'))
+
+        # Summary
+        self.stdout.write(self.style.SUCCESS('\n=== Summary ==='))
+        self.stdout.write(f'Columns: {", ".join(IMPORT_COLUMNS[options["kind"]])}')
+        prefix = 'Would have ' if result.rolled_back else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}{"c" if prefix else "C"}reated: {result.created}'))
+        self.stdout.write(self.style.SUCCESS(f'{prefix}{"u" if prefix else "U"}pdated: {result.updated}'))
+        self.stdout.write(f'Unchanged: {result.unchanged}')
+        if result.errors:
+            self.stdout.write(self.style.ERROR(f'Rows with errors: {len(result.errors)}'))
+        if result.rolled_back:
+            reason = 'dry run' if options['dry_run'] and not result.errors else 'fix the errors or use --skip-invalid'
+            self.stdout.write(self.style.WARNING(f'Nothing was saved ({reason})'))
+        self.stdout.write(f'Finished in {time.perf_counter() - start:.1f}s')
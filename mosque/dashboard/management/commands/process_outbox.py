@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from dashboard.outbox import process_batch, release_stale
+from dashboard.whatsapp_web_service import WhatsAppWebService
+import datetime
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send queued WhatsApp messages from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of messages claimed per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Seconds to wait when the queue is empty or WhatsApp is not ready (default: 5)',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Requeue messages stuck in "sending" for this many seconds (default: 600)',
+        )
+
+    def handle(self, *args, **options):
+        once = options['once']
+        batch_size = options['batch_size']
+        sleep_seconds = options['sleep']
+        stale_after = datetime.timedelta(seconds=options['stale_after'])
+
+        whatsapp = WhatsAppWebService()
+        whatsapp.add_breaker_listener(
+            lambda url, old, new: self.stdout.write(self.style.WARNING(f'WhatsApp circuit {url}: {old} -> {new}'))
+        )
+        total_sent = 0
+        total_failed = 0
+
+        self.stdout.write(self.style.SUCCESS('Outbox worker started'))
+
+        try:
+            while True:
+                released = release_stale(timezone.now() - stale_after)
+                if released:
+                    self.stdout.write(self.style.WARNING(f'Requeued {released} stale message(s)'))
+
+                if whatsapp.circuit_open:
+                    if once:
+                        self.stdout.write(self.style.ERROR('WhatsApp service is unavailable (circuit open).'))
+                        break
+                    time.sleep(max(sleep_seconds, whatsapp.retry_after()))
+                    continue
+
+                if not whatsapp.is_ready():
+                    if once:
+                        self.stdout.write(self.style.ERROR('WhatsApp service is not ready. Make sure it\'s running and authenticated.'))
+                        break
+                    time.sleep(sleep_seconds)
+                    continue
+
+                sent_count, failed_count, not_attempted = process_batch(whatsapp, batch_size)
+                total_sent += sent_count
+                total_failed += failed_count
+
+                if not_attempted:
+                    self.stdout.write(self.style.ERROR(
+                        f'Circuit opened after repeated failures: {not_attempted} message(s) returned to the queue'
+                    ))
+                if sent_count or failed_count or not_attempted:
+                    self.stdout.write(f'Batch done: {sent_count} sent, {failed_count} failed')
+                    continue
+
+                if once:
+                    break
+                time.sleep(sleep_seconds)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nStopping outbox worker'))
+
+        # Summary
+        self.stdout.write(self.style.SUCCESS('\n=== Summary ==='))
+        self.stdout.write(self.style.SUCCESS(f'Successfully sent: {total_sent}'))
+        if total_failed > 0:
+            self.stdout.write(self.style.ERROR(f'Failed: {total_failed}'))
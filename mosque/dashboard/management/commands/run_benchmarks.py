@@ -0,0 +1,213 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from dashboard import urls as dashboard_urls
+from dashboard.models import Mosque, Imam, Schedule, BroadcastJob
+from dashboard.whatsapp_web_service import service_urls
+from unittest import mock
+import datetime
+import io
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+
+# POST-only views that queue WhatsApp messages; benchmarked inside a rolled back transaction
+BROADCAST_VIEWS = {
+    'send_mosque_notification': {'target_weekday': 0},
+    'send_weekly_mosque_reminders': {},
+    'send_today_reminders': {'target_weekday': 0},
+    'send_weekly_reminders': {},
+}
+
+PK_MODELS = {
+    'mosque': Mosque,
+    'imam': Imam,
+    'schedule': Schedule,
+    'broadcast': BroadcastJob,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time every dashboard URL and send_daily_reminders --test, and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per target (default: 5)')
+        parser.add_argument(
+            '--output',
+            help='JSON results file (default: benchmark-<timestamp>.json in the current directory)',
+        )
+        parser.add_argument('--compare', help='Previous JSON results file to print deltas against')
+        parser.add_argument(
+            '--skip-broadcasts',
+            action='store_true',
+            help='Do not benchmark the POST broadcast views',
+        )
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        results = []
+
+        # Pages read the polled WhatsApp status; serve a ready one so the broadcasts
+        # take the queueing path and no background poller is started
+        sessions = [
+            {'url': url, 'ready': True, 'qr': '', 'message': '', 'error': '', 'error_at': None, 'checked_at': None}
+            for url in service_urls()
+        ]
+        with mock.patch('dashboard.views.status_snapshot', return_value=sessions), \
+                mock.patch('dashboard.views.whatsapp_ready', return_value=True):
+            for name, url, method, data in self.targets(options['skip_broadcasts']):
+                results.append(self.measure(name, repeat, lambda: self.request(url, method, data), url=url))
+                self.report(results[-1])
+
+        results.append(self.measure('send_daily_reminders --test', repeat, self.run_daily_reminders))
+        self.report(results[-1])
+
+        output = {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': self.git_commit(),
+            'database': connection.vendor,
+            'rows': {
+                'mosques': Mosque.objects.count(),
+                'imams': Imam.objects.count(),
+                'schedules': Schedule.objects.count(),
+            },
+            'repeat': repeat,
+            'results': results,
+        }
+
+        path = options['output'] or f"benchmark-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'\nResults written to {path}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def targets(self, skip_broadcasts):
+        """Yield (name, url, method, data) for every URL in dashboard/urls.py"""
+        for pattern in dashboard_urls.urlpatterns:
+            name = pattern.name
+            kwargs = {}
+
+            if 'pk' in pattern.pattern.converters:
+                model = PK_MODELS[name.split('_')[0]]
+                pk = model.objects.order_by('pk').values_list('pk', flat=True).first()
+                if pk is None:
+                    self.stdout.write(self.style.WARNING(f'Skipping {name}: no {model.__name__} rows'))
+                    continue
+                kwargs['pk'] = pk
+
+            url = reverse(name, kwargs=kwargs)
+            if name in BROADCAST_VIEWS:
+                if not skip_broadcasts:
+                    yield name, url, 'post', BROADCAST_VIEWS[name]
+            else:
+                yield name, url, 'get', None
+
+    def request(self, url, method, data):
+        client = Client()
+        if method == 'get':
+            response = client.get(url)
+            if response.streaming:
+                # Exports do their work while the body is consumed
+                for _ in response.streaming_content:
+                    pass
+            return response.status_code
+
+        # Broadcasts write outbox rows; measure them without keeping the rows
+        status_code = None
+        try:
+            with transaction.atomic():
+                status_code = client.post(url, data).status_code
+                raise Rollback
+        except Rollback:
+            pass
+        return status_code
+
+    def run_daily_reminders(self):
+        call_command('send_daily_reminders', test=True, stdout=io.StringIO())
+        return None
+
+    def measure(self, name, repeat, func, url=None):
+        """Run func `repeat` times after one cold run, recording time, queries and peak memory"""
+        cache.clear()
+        timings = []
+        cold_ms = None
+        query_count = 0
+        peak_kib = 0
+        status_code = None
+
+        for run in range(repeat + 1):
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                status_code = func()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if run == 0:
+                cold_ms = elapsed_ms
+            else:
+                timings.append(elapsed_ms)
+            query_count = len(queries)
+            peak_kib = max(peak_kib, peak / 1024)
+
+        return {
+            'name': name,
+            'url': url,
+            'status': status_code,
+            'cold_ms': round(cold_ms, 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': query_count,
+            'peak_memory_kib': round(peak_kib, 1),
+        }
+
+    def report(self, result):
+        status = f" [{result['status']}]" if result['status'] is not None else ''
+        self.stdout.write(
+            f"{result['name']:<32}{status:>6} median {result['median_ms']:>9.2f} ms  "
+            f"cold {result['cold_ms']:>9.2f} ms  {result['queries']:>5} queries  "
+            f"{result['peak_memory_kib']:>10.1f} KiB peak"
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            previous = {result['name']: result for result in json.load(f)['results']}
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Compared with {path} ==='))
+        for result in results:
+            before = previous.get(result['name'])
+            if not before:
+                continue
+            delta = result['median_ms'] - before['median_ms']
+            percent = delta * 100 / before['median_ms'] if before['median_ms'] else 0
+            line = (
+                f"{result['name']:<32} {before['median_ms']:>9.2f} -> {result['median_ms']:>9.2f} ms "
+                f"({percent:+.1f}%)  queries {before['queries']} -> {result['queries']}"
+            )
+            if percent > 10 or result['queries'] > before['queries']:
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+    def git_commit(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from dashboard.models import Mosque, Imam, Schedule
+from dashboard.stats import invalidate_home_stats
+import random
+import time
+
+
+BENCHMARK_PREFIX = 'BENCH'
+
+
+class Command(BaseCommand):
+    help = 'Generate large volumes of mosques, imams and schedules for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mosques', type=int, default=10000, help='Number of mosques (default: 10000)')
+        parser.add_argument('--imams', type=int, default=5000, help='Number of imams (default: 5000)')
+        parser.add_argument('--schedules', type=int, default=70000, help='Number of schedules (default: 70000)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT (default: 2000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data (default: 42)')
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously seeded benchmark rows first (only rows created by this command)',
+        )
+
+    def handle(self, *args, **options):
+        mosque_count = options['mosques']
+        imam_count = options['imams']
+        schedule_count = options['schedules']
+        batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+
+        slots_per_mosque = len(Schedule.WEEKDAY_CHOICES) * len(Schedule.PRAYER_TIME_CHOICES)
+        if schedule_count and (mosque_count < 1 or imam_count < 1):
+            raise CommandError('Schedules need at least one mosque and one imam')
+        if schedule_count > mosque_count * slots_per_mosque:
+            raise CommandError(
+                f'At most {mosque_count * slots_per_mosque} schedules fit {mosque_count} mosques '
+                f'({slots_per_mosque} weekday/prayer slots each)'
+            )
+
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            if options['clear']:
+                deleted, _ = Mosque.objects.filter(name__startswith=BENCHMARK_PREFIX).delete()
+                deleted_imams, _ = Imam.objects.filter(name__startswith=BENCHMARK_PREFIX).delete()
+                self.stdout.write(self.style.WARNING(f'Deleted {deleted + deleted_imams} benchmark row(s)'))
+
+            country_codes = [code for code, _ in Mosque.COUNTRY_CODES]
+            mosques = Mosque.objects.bulk_create(
+                (
+                    Mosque(
+                        name=f'{BENCHMARK_PREFIX} Mosque {index:06d}',
+                        address=f'District {rng.randint(1, 500)}, Street {rng.randint(1, 200)}',
+                        country_code=rng.choice(country_codes),
+                        phone=f'5{rng.randint(0, 99999999):08d}' if rng.random() < 0.8 else '',
+                    )
+                    for index in range(mosque_count)
+                ),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f'Created {len(mosques)} mosque(s)')
+
+            imams = Imam.objects.bulk_create(
+                (
+                    Imam(
+                        name=f'{BENCHMARK_PREFIX} Imam {index:06d}',
+                        country_code=rng.choice(country_codes),
+                        phone=f'5{rng.randint(0, 99999999):08d}',
+                    )
+                    for index in range(imam_count)
+                ),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f'Created {len(imams)} imam(s)')
+
+            # Each pass over the mosques gives every mosque one more slot. A mosque's
+            # slots start at its own offset, so no slot repeats within a mosque
+            # (unique_together) and consecutive mosques land on consecutive weekdays
+            weekdays = [weekday for weekday, _ in Schedule.WEEKDAY_CHOICES]
+            prayer_times = [code for code, _ in Schedule.PRAYER_TIME_CHOICES]
+            slots = [(weekday, prayer_time) for prayer_time in prayer_times for weekday in weekdays]
+
+            def schedules():
+                for index in range(schedule_count):
+                    weekday, prayer_time = slots[(index // mosque_count + index % mosque_count) % len(slots)]
+                    yield Schedule(
+                        mosque=mosques[index % mosque_count],
+                        imam=rng.choice(imams),
+                        weekday=weekday,
+                        prayer_time=prayer_time,
+                        notes='' if rng.random() < 0.7 else 'ملاحظة',
+                    )
+
+            created = Schedule.objects.bulk_create(schedules(), batch_size=batch_size)
+            self.stdout.write(f'Created {len(created)} schedule(s)')
+
+        # bulk_create bypasses the save signals
+        invalidate_home_stats()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Seeded benchmark data in {elapsed:.1f}s'))
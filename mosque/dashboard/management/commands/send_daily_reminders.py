@@ -1,11 +1,52 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from dashboard.models import Schedule
-from dashboard.whatsapp_web_service import WhatsAppWebService
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from dashboard.models import Schedule, Delivery
+from dashboard.whatsapp_web_service import WhatsAppWebService, SendResult, CIRCUIT_OPEN_MESSAGE
+from django.conf import settings
+from argparse import ArgumentTypeError, BooleanOptionalAction
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import json
+import threading
 import time
-import random
-from hijri_converter import Gregorian
+from dashboard.hijri import hijri_date_str as format_hijri_date, model_weekday, week_dates
+from dashboard.profiling import profile_call
+from dashboard import metrics
+from dashboard.deliveries import claim, delivered_keys, record_results, release
+from dashboard.outbox import enqueue_retries
+from dashboard.reminders import coalesce_enabled, group_by_imam, combined_imam_reminder
+
+
+class Pacer:
+    """Thread-safe pacing: hands out send slots no closer than 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self, count=1):
+        """Block until `count` more sends may start"""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval * count
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def shard_spec(value):
+    """Parse --shard "i/N" into (i, N) with 0 <= i < N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ArgumentTypeError(f'expected i/N, got "{value}"')
+    if count < 1 or not 0 <= index < count:
+        raise ArgumentTypeError(f'shard index must be between 0 and {count - 1}')
+    return index, count
 
 
 class Command(BaseCommand):
@@ -17,31 +58,133 @@ class Command(BaseCommand):
             action='store_true',
             help='Test mode - show what would be sent without actually sending',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of batches sent in parallel (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Messages per /send-batch request (default: WHATSAPP_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Extra cap on messages started per second by this run, 0 for none; '
+                 'WHATSAPP_RATE_LIMIT always applies across all processes (default: 0)',
+        )
+        parser.add_argument(
+            '--shard',
+            type=shard_spec,
+            default=None,
+            metavar='i/N',
+            help='Only handle shard i of N (i from 0 to N-1); run one process per shard to split the day across hosts',
+        )
+        parser.add_argument(
+            '--shard-by',
+            choices=['imam', 'mosque'],
+            default='imam',
+            help='Partition schedules by imam id (keeps coalesced messages whole) or mosque id (default: imam)',
+        )
+        parser.add_argument(
+            '--prayer',
+            action='append',
+            choices=[code for code, _ in Schedule.PRAYER_TIME_CHOICES],
+            help='Only this prayer time (repeat for several)',
+        )
+        parser.add_argument(
+            '--mosque',
+            action='append',
+            type=int,
+            metavar='MOSQUE_ID',
+            help='Only schedules of this mosque (repeat for several)',
+        )
+        day = parser.add_mutually_exclusive_group()
+        day.add_argument(
+            '--weekday',
+            type=int,
+            choices=range(7),
+            help='Send for the next occurrence of this weekday (0=Saturday ... 6=Friday) instead of today',
+        )
+        day.add_argument(
+            '--date',
+            type=datetime.date.fromisoformat,
+            help='Send for this date (YYYY-MM-DD) instead of today',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='With --test, write the rendered messages to this file as JSON lines instead of printing them',
+        )
+        parser.add_argument(
+            '--coalesce',
+            action=BooleanOptionalAction,
+            default=None,
+            help='Send one combined message per imam booked more than once today (default: COALESCE_REMINDERS)',
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Run under cProfile and write the stats to PROFILE_DIR (send worker threads are not profiled)',
+        )
 
     def handle(self, *args, **options):
+        mode = 'test' if options['test'] else 'send'
+        with metrics.REMINDER_RUN_DURATION.labels(mode).time():
+            if not options['profile']:
+                return self.send_reminders(**options)
+
+            _, path = profile_call('send_daily_reminders', self.send_reminders, **options)
+            self.stdout.write(self.style.SUCCESS(f'Profile written to {path}'))
+
+    def filtered_schedules(self, weekday, options):
+        """Schedules for the weekday, narrowed by the --prayer, --mosque and --shard options in SQL"""
+        schedules = Schedule.objects.filter(weekday=weekday)
+        if options['prayer']:
+            schedules = schedules.filter(prayer_time__in=options['prayer'])
+        if options['mosque']:
+            schedules = schedules.filter(mosque_id__in=options['mosque'])
+        if options['shard']:
+            index, count = options['shard']
+            schedules = schedules.alias(shard=F(f'{options["shard_by"]}_id') % count).filter(shard=index)
+        return schedules.select_related('mosque', 'imam').order_by('id')
+
+    def send_reminders(self, **options):
         test_mode = options['test']
+        if options['output'] and not test_mode:
+            raise CommandError('--output is only supported together with --test')
+        concurrency = max(1, options['concurrency'])
+        batch_size = max(1, options['batch_size'] or getattr(settings, 'WHATSAPP_BATCH_SIZE', 25))
+        pacer = Pacer(options['rate'])
+        coalesce = coalesce_enabled() if options['coalesce'] is None else options['coalesce']
+        
+        # Target day (today unless --date/--weekday) and its weekday (0=Saturday in our model)
+        if options['date']:
+            target_date = options['date']
+        elif options['weekday'] is not None:
+            target_date = week_dates()[options['weekday']][0]
+        else:
+            target_date = datetime.date.today()
+        today_weekday = model_weekday(target_date)
         
-        # Get today's weekday (0=Saturday in our model)
-        today = datetime.datetime.now()
-        weekday_map = {
-            5: 0,  # Saturday
-            6: 1,  # Sunday
-            0: 2,  # Monday
-            1: 3,  # Tuesday
-            2: 4,  # Wednesday
-            3: 5,  # Thursday
-            4: 6,  # Friday
-        }
-        today_weekday = weekday_map[today.weekday()]
-        
-        # Get all schedules for today
-        schedules = Schedule.objects.filter(weekday=today_weekday).select_related('mosque', 'imam')
-        
-        if not schedules.exists():
-            self.stdout.write(self.style.WARNING('No schedules found for today.'))
+        # Get the schedules for that day
+        schedules = list(self.filtered_schedules(today_weekday, options))
+        
+        if not schedules:
+            self.stdout.write(self.style.WARNING(f'No schedules found for {target_date}.'))
             return
         
-        self.stdout.write(self.style.SUCCESS(f'Found {schedules.count()} schedule(s) for today'))
+        self.stdout.write(self.style.SUCCESS(f'Found {len(schedules)} schedule(s) for {target_date}'))
+        
+        # Reminders delivered by an earlier run (or the dashboard button) are
+        # skipped, so re-running after a failure only sends the remaining ones
+        delivered = delivered_keys('today', [target_date])
+        remaining = [schedule for schedule in schedules if (schedule.id, target_date) not in delivered]
+        already_delivered_count = len(schedules) - len(remaining)
         
         # Initialize WhatsApp service
         whatsapp = WhatsAppWebService()
@@ -50,32 +193,27 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('WhatsApp service is not ready. Make sure it\'s running and authenticated.'))
             return
         
-        # Send notifications
-        sent_count = 0
-        failed_count = 0
-        total_schedules = schedules.count()
+        # Every schedule is for the same day, so convert the date once
+        hijri_date_str = format_hijri_date(target_date)
+        today_dates = {today_weekday: (target_date, hijri_date_str)}
         
-        for index, schedule in enumerate(schedules, 1):
-            imam = schedule.imam
+        def reminder(group):
+            """Message for one imam's schedules; a combined one when coalescing grouped several"""
+            if len(group) > 1:
+                return combined_imam_reminder(group, today_dates)
+            
+            schedule = group[0]
             mosque = schedule.mosque
             
             # Get prayer time and weekday in Arabic
             prayer_time_display = dict(Schedule.PRAYER_TIME_CHOICES).get(schedule.prayer_time)
             weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(schedule.weekday)
             
-            # Convert to Hijri date
-            hijri_date = Gregorian(today.year, today.month, today.day).to_hijri()
-            hijri_months = [
-                'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-                'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-            ]
-            hijri_month_name = hijri_months[hijri_date.month - 1]
-            hijri_date_str = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
-            
-            # Create message
+            # Create message ("today" unless --date/--weekday picked another day)
+            day_display = 'اليوم' if target_date == datetime.date.today() else f'يوم {weekday_display}'
             message = f"""السلام عليكم ورحمة الله وبركاته
 
-تذكير: لديك موعد إلقاء كلمة اليوم
+تذكير: لديك موعد إلقاء كلمة {day_display}
 🕌 المسجد: {mosque.name}
 📍 الموقع: {mosque.address}
 📅 التاريخ: {hijri_date_str}
@@ -87,29 +225,120 @@ class Command(BaseCommand):
                 message += f"\n📞 هاتف المسجد: {mosque.phone}"
             
             message += "\n\nعند الانتهاء من إلقاء الكلمة يرجى إرسال رسالة:\n\"تم الانتهاء من إلقاء الكلمة\"\n\nجزاك الله خيراً"
-            
-            phone_number = imam.get_full_phone()
-            
-            if test_mode:
-                self.stdout.write(self.style.WARNING(f'\n[TEST MODE] Would send to {imam.name} ({phone_number}):'))
-                self.stdout.write(message)
+            return message
+        
+        # One message per schedule, or per imam when coalescing
+        groups = group_by_imam(remaining, coalesce)
+        if coalesce and len(groups) < len(remaining):
+            self.stdout.write(self.style.SUCCESS(f'Coalesced into {len(groups)} message(s)'))
+        
+        sent_count = 0
+        failed_count = 0
+        
+        if test_mode and options['output']:
+            # One JSON object per message; much faster than styled stdout and easy to diff
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for group in groups:
+                    imam = group[0].imam
+                    output.write(json.dumps({
+                        'date': target_date.isoformat(),
+                        'schedules': [schedule.id for schedule in group],
+                        'imam': imam.name,
+                        'phone': imam.get_full_phone(),
+                        'message': reminder(group),
+                    }, ensure_ascii=False) + '\n')
+                    sent_count += 1
+            self.stdout.write(self.style.SUCCESS(f'Messages written to {options["output"]}'))
+        elif test_mode:
+            for group in groups:
+                imam = group[0].imam
+                self.stdout.write(self.style.WARNING(f'\n[TEST MODE] Would send to {imam.name} ({imam.get_full_phone()}):'))
+                self.stdout.write(reminder(group))
                 sent_count += 1
-            else:
-                # Send message
-                success, response_message = whatsapp.send_message(phone_number, message)
-                
-                if success:
+        
+        def send(chunk):
+            if not chunk:
+                return []
+            # Queued chunks stop as soon as the circuit breaker opens
+            if whatsapp.circuit_open:
+                return [SendResult(False, CIRCUIT_OPEN_MESSAGE, 'circuit_open') for _ in chunk]
+            pacer.wait(len(chunk))
+            return whatsapp.send_batch([(phone_number, message) for _, phone_number, message, _ in chunk])
+        
+        not_attempted_count = 0
+        retrying_count = 0
+        dead_count = 0
+        
+        def finish(chunk, results):
+            nonlocal sent_count, failed_count, not_attempted_count, retrying_count, dead_count
+            sent = []
+            failures = []
+            not_attempted = []
+            for (imam, phone_number, message, delivery_ids), result in zip(chunk, results):
+                if result.outcome == 'circuit_open':
+                    not_attempted.extend(delivery_ids)
+                    not_attempted_count += 1
+                elif result.success:
                     self.stdout.write(self.style.SUCCESS(f'✓ Sent to {imam.name} ({phone_number})'))
+                    sent.extend((delivery_id, Delivery.STATUS_SENT, result.message) for delivery_id in delivery_ids)
                     sent_count += 1
                 else:
-                    self.stdout.write(self.style.ERROR(f'✗ Failed to send to {imam.name}: {response_message}'))
+                    self.stdout.write(self.style.ERROR(f'✗ Failed to send to {imam.name}: {result.message}'))
+                    failures.append((imam.name, phone_number, message, result, delivery_ids))
                     failed_count += 1
+            record_results('id', sent)
+            release(not_attempted)
+            # The outbox worker retries transient failures with backoff
+            retrying, dead = enqueue_retries('today', failures)
+            retrying_count += retrying
+            dead_count += dead
+        
+        def claim_chunk(chunk):
+            """Claim a chunk of groups and build the messages for the schedules this run owns"""
+            nonlocal already_delivered_count
+            claimed = claim('today', [(schedule.id, target_date) for group in chunk for schedule in group])
+            items = []
+            for group in chunk:
+                owned = [schedule for schedule in group if (schedule.id, target_date) in claimed]
+                already_delivered_count += len(group) - len(owned)
+                if owned:
+                    imam = owned[0].imam
+                    delivery_ids = [claimed[(schedule.id, target_date)] for schedule in owned]
+                    items.append((imam, imam.get_full_phone(), reminder(owned), delivery_ids))
+            return items
+        
+        chunks = [] if test_mode else [groups[start:start + batch_size] for start in range(0, len(groups), batch_size)]
+        
+        # Each chunk is claimed in the delivery ledger just before it is handed
+        # to a worker, so a run started meanwhile never sends it a second time.
+        # Results are recorded in schedule order as chunks complete.
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for chunk in chunks:
+                items = claim_chunk(chunk)
+                in_flight.append((items, executor.submit(send, items)))
+                if len(in_flight) > concurrency:
+                    items, future = in_flight.popleft()
+                    finish(items, future.result())
+            while in_flight:
+                items, future = in_flight.popleft()
+                finish(items, future.result())
         
         # Summary
-        self.stdout.write(self.style.SUCCESS(f'\n=== Summary ==='))
+        self.stdout.write(self.style.SUCCESS('\n=== Summary ==='))
+        if already_delivered_count > 0:
+            self.stdout.write(self.style.WARNING(f'Already delivered (skipped): {already_delivered_count}'))
         if test_mode:
             self.stdout.write(self.style.SUCCESS(f'Would send {sent_count} message(s)'))
         else:
             self.stdout.write(self.style.SUCCESS(f'Successfully sent: {sent_count}'))
             if failed_count > 0:
                 self.stdout.write(self.style.ERROR(f'Failed: {failed_count}'))
+            if retrying_count > 0:
+                self.stdout.write(self.style.WARNING(f'Queued for automatic retry by process_outbox: {retrying_count}'))
+            if dead_count > 0:
+                self.stdout.write(self.style.ERROR(f'Not retried (e.g. number not on WhatsApp, listed on the dashboard): {dead_count}'))
+            if not_attempted_count > 0:
+                self.stdout.write(self.style.ERROR(
+                    f'Not attempted (WhatsApp service unavailable, circuit open): {not_attempted_count}'
+                ))
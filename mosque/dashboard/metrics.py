@@ -0,0 +1,113 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+
+# With PROMETHEUS_MULTIPROC_DIR set, every process (web workers, outbox
+# worker, cron runs of send_daily_reminders) writes its samples to files in
+# that directory and /metrics aggregates them. Without it the metrics only
+# cover the process serving /metrics.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+SEND_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_DURATION = Histogram(
+    'dashboard_request_duration_seconds',
+    'Dashboard request latency by URL name',
+    ['view', 'method'],
+)
+WHATSAPP_SEND_DURATION = Histogram(
+    'dashboard_whatsapp_send_duration_seconds',
+    'Latency of one WhatsApp service send call (/send or one /send-batch chunk)',
+    ['endpoint'],
+    buckets=SEND_BUCKETS,
+)
+WHATSAPP_MESSAGES = Counter(
+    'dashboard_whatsapp_messages_total',
+    'WhatsApp messages by outcome (sent, not_registered, timeout, connection_error, ...)',
+    ['outcome'],
+)
+WHATSAPP_RATE_LIMIT_WAIT = Counter(
+    'dashboard_whatsapp_rate_limit_wait_seconds',
+    'Time spent waiting for the shared WhatsApp send-rate limiter',
+)
+WHATSAPP_READY_CHECK_DURATION = Histogram(
+    'dashboard_whatsapp_ready_check_duration_seconds',
+    'Latency of WhatsApp /status readiness checks',
+)
+REMINDER_RUN_DURATION = Histogram(
+    'dashboard_reminder_run_duration_seconds',
+    'Duration of send_daily_reminders runs',
+    ['mode'],
+    buckets=(1, 5, 15, 60, 300, 900, 1800, 3600, 7200),
+)
+
+
+class OutboxCollector:
+    """Report the outbox queue depth at scrape time (uses the cached queue_stats)"""
+
+    def families(self):
+        messages = GaugeMetricFamily(
+            'dashboard_outbox_messages',
+            'Outbox messages by status (sent/dead count today only)',
+            labels=['status'],
+        )
+        depth = GaugeMetricFamily('dashboard_outbox_depth', 'Messages waiting to be sent')
+        return messages, depth
+
+    def describe(self):
+        # Lets the registry learn the metric names without querying the database
+        return self.families()
+
+    def collect(self):
+        from .outbox import queue_stats
+
+        stats = queue_stats()
+        messages, depth = self.families()
+        for status in ('pending', 'sending', 'retrying', 'sent', 'dead'):
+            messages.add_metric([status], stats[status])
+        depth.add_metric([], stats['depth'])
+        return messages, depth
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(OutboxCollector())
+
+
+def observe_request(view_name, method, seconds):
+    REQUEST_DURATION.labels(view_name, method).observe(seconds)
+
+
+def count_outcomes(outcomes):
+    for outcome in outcomes:
+        WHATSAPP_MESSAGES.labels(outcome).inc()
+
+
+def observe_send(endpoint, seconds, outcomes=()):
+    """Record one send call and the final outcome of every message it carried"""
+    WHATSAPP_SEND_DURATION.labels(endpoint).observe(seconds)
+    count_outcomes(outcomes)
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(OutboxCollector())
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
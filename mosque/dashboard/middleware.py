@@ -0,0 +1,207 @@
+import json
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from . import metrics, timing
+from .profiling import profile_call
+
+
+logger = logging.getLogger('dashboard.timing')
+profile_logger = logging.getLogger('dashboard.profiling')
+
+
+def _time_sql(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = timing.current()
+        if timings is not None:
+            duration_ms = (time.perf_counter() - start) * 1000
+            timings.add('db', duration_ms)
+            timings.queries.append((sql, duration_ms))
+
+
+def _add_sql_timing(connection, **kwargs):
+    if _time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_sql)
+
+
+def _install_sql_timing():
+    """
+    Time SQL on every database connection, open now or opened later
+
+    A permanent wrapper per connection instead of connection.execute_wrapper()
+    around the request: async views run their queries in sync_to_async
+    threads, whose connections the middleware never sees. The request's
+    timings reach those threads through the context variable.
+    """
+    connection_created.connect(_add_sql_timing, dispatch_uid='dashboard.sql_timing')
+    for connection in connections.all(initialized_only=True):
+        _add_sql_timing(connection)
+
+
+def _install_template_timing():
+    """Wrap Template.render so the outermost render of each request is timed"""
+    original_render = Template.render
+    if getattr(original_render, 'timed', False):
+        return
+
+    def render(self, context):
+        timings = timing.current()
+        if timings is None:
+            return original_render(self, context)
+
+        # {% include %} and {% extends %} render nested templates; count them once
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            timings.template_depth -= 1
+            if timings.template_depth == 0:
+                timings.add('template', (time.perf_counter() - start) * 1000)
+
+    render.timed = True
+    Template.render = render
+
+
+class RequestTimingMiddleware:
+    """
+    Measure SQL, template and WhatsApp time for every request
+
+    The totals are sent in a Server-Timing header (visible in the browser's
+    network panel) and logged as one JSON line on the 'dashboard.timing'
+    logger. Requests slower than REQUEST_TIME_BUDGET_MS are logged as
+    warnings together with every SQL statement they ran.
+
+    Time spent in SQL issued while a template renders is counted in both
+    'db' and 'tpl'. Works for sync and async views alike.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budget_ms = getattr(settings, 'REQUEST_TIME_BUDGET_MS', 500)
+        _install_template_timing()
+        _install_sql_timing()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.stop(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total_ms = timings.total_ms()
+        response['Server-Timing'] = self.server_timing(timings, total_ms)
+        view_name = request.resolver_match.url_name if request.resolver_match else None
+        metrics.observe_request(view_name or 'unresolved', request.method, total_ms / 1000)
+        self.log(request, response, timings, total_ms)
+        return response
+
+    def server_timing(self, timings, total_ms):
+        durations = timings.durations
+        counts = timings.counts
+        return ', '.join([
+            f'db;dur={durations.get("db", 0):.1f};desc="{counts.get("db", 0)} queries"',
+            f'tpl;dur={durations.get("template", 0):.1f}',
+            f'whatsapp;dur={durations.get("whatsapp", 0):.1f};desc="{counts.get("whatsapp", 0)} calls"',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+    def log(self, request, response, timings, total_ms):
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'queries': timings.counts.get('db', 0),
+            'db_ms': round(timings.durations.get('db', 0), 1),
+            'template_ms': round(timings.durations.get('template', 0), 1),
+            'whatsapp_calls': timings.counts.get('whatsapp', 0),
+            'whatsapp_ms': round(timings.durations.get('whatsapp', 0), 1),
+        }
+
+        if total_ms <= self.budget_ms:
+            logger.info(json.dumps(entry))
+            return
+
+        entry['over_budget_ms'] = self.budget_ms
+        entry['sql'] = [
+            {'ms': round(duration_ms, 2), 'sql': sql}
+            for sql, duration_ms in timings.queries
+        ]
+        logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single view on demand
+
+    Staff users add ?profile=1 to the URL (or send an X-Profile header) and
+    the view runs under cProfile; the stats file is written to PROFILE_DIR
+    and its name returned in the X-Profile-File response header. Other
+    requests only pay for the query string/header lookup.
+
+    Must come after AuthenticationMiddleware and CsrfViewMiddleware. Async
+    views are not profiled: cProfile cannot follow a coroutine across awaits.
+    They answer with an X-Profile-Skipped header instead, so a missing
+    profile is not mistaken for a fast view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.mark_skipped(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.mark_skipped(request, await self.get_response(request))
+
+    def mark_skipped(self, request, response):
+        if getattr(request, 'profile_skipped', False):
+            response['X-Profile-Skipped'] = 'async view'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if 'profile' not in request.GET and 'HTTP_X_PROFILE' not in request.META:
+            return None
+        if not request.user.is_staff:
+            return None
+        if iscoroutinefunction(view_func):
+            request.profile_skipped = True
+            return None
+
+        view_name = request.resolver_match.view_name or view_func.__name__
+        response, path = profile_call(view_name, view_func, request, *view_args, **view_kwargs)
+        profile_logger.info('Profiled %s %s -> %s', request.method, request.path, path)
+        response['X-Profile-File'] = path.name
+        return response
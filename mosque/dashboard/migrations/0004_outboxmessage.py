@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-17 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_mosque_country_code_alter_mosque_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('today', 'تذكير يومي'), ('weekly', 'تذكير أسبوعي'), ('mosque', 'إشعار المساجد'), ('weekly_mosque', 'إشعار أسبوعي للمساجد')], max_length=20, verbose_name='Kind')),
+                ('recipient_name', models.CharField(blank=True, max_length=200, verbose_name='Recipient')),
+                ('phone_number', models.CharField(max_length=25, verbose_name='Phone')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('sending', 'جاري الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل الإرسال')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('response', models.TextField(blank=True, verbose_name='Response')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Claimed at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+            ],
+            options={
+                'verbose_name': 'Outbox message',
+                'verbose_name_plural': 'Outbox messages',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='outbox_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imam',
+            index=models.Index(fields=['name'], name='imam_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mosque',
+            index=models.Index(fields=['name'], name='mosque_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['weekday', 'prayer_time'], name='schedule_weekday_prayer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['weekday', 'mosque'], name='schedule_weekday_mosque_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['imam', 'weekday'], name='schedule_imam_weekday_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_weekday_and_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='imam',
+            name='imam_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='mosque',
+            name='mosque_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='imam',
+            index=models.Index(fields=['name', 'id'], name='imam_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mosque',
+            index=models.Index(fields=['name', 'id'], name='mosque_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['weekday', 'id'], name='schedule_weekday_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('today', 'تذكير يومي'), ('weekly', 'تذكير أسبوعي'), ('mosque', 'إشعار المساجد'), ('weekly_mosque', 'إشعار أسبوعي للمساجد')], max_length=20, verbose_name='Kind')),
+                ('target_date', models.DateField(verbose_name='Target date')),
+                ('status', models.CharField(choices=[('pending', 'قيد الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل الإرسال')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('response', models.TextField(blank=True, verbose_name='Response')),
+                ('claim_token', models.CharField(blank=True, editable=False, max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Claimed at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('outbox', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='dashboard.outboxmessage', verbose_name='Outbox message')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.schedule', verbose_name='Schedule')),
+            ],
+            options={
+                'verbose_name': 'Delivery',
+                'verbose_name_plural': 'Deliveries',
+                'ordering': ['-target_date', 'id'],
+                'unique_together': {('kind', 'target_date', 'schedule')},
+            },
+        ),
+    ]
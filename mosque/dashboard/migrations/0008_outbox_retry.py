@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+def retire_old_failures(apps, schema_editor):
+    # Failures recorded before retries existed will not be retried; list them as dead letters
+    OutboxMessage = apps.get_model('dashboard', 'OutboxMessage')
+    OutboxMessage.objects.filter(status='failed', next_attempt_at__isnull=True).update(status='dead')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Next attempt at'),
+        ),
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'في الانتظار'), ('sending', 'جاري الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل الإرسال - ستتم إعادة المحاولة'), ('dead', 'تعذر الإرسال')], default='pending', max_length=10, verbose_name='Status'),
+        ),
+        migrations.RunPython(retire_old_failures, migrations.RunPython.noop),
+    ]
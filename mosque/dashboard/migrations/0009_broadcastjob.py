@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_outbox_retry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('today', 'تذكير يومي'), ('weekly', 'تذكير أسبوعي'), ('mosque', 'إشعار المساجد'), ('weekly_mosque', 'إشعار أسبوعي للمساجد')], max_length=20, verbose_name='Kind')),
+                ('label', models.CharField(blank=True, max_length=200, verbose_name='Label')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Broadcast',
+                'verbose_name_plural': 'Broadcasts',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='dashboard.broadcastjob', verbose_name='Broadcast'),
+        ),
+    ]
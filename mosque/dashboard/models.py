@@ -33,6 +33,10 @@ class Mosque(models.Model):
     class Meta:
         verbose_name = _('Mosque')
         verbose_name_plural = _('Mosques')
+        indexes = [
+            # Name ordering and keyset pagination of the mosque list
+            models.Index(fields=['name', 'id'], name='mosque_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +79,10 @@ class Imam(models.Model):
     class Meta:
         verbose_name = _('Caller')
         verbose_name_plural = _('Callers')
+        indexes = [
+            # Name ordering and keyset pagination of the caller list
+            models.Index(fields=['name', 'id'], name='imam_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -113,6 +121,133 @@ class Schedule(models.Model):
         verbose_name = _('Schedule')
         verbose_name_plural = _('Schedules')
         unique_together = ['mosque', 'weekday', 'prayer_time']
+        indexes = [
+            # Daily views filter by weekday and order by prayer time
+            models.Index(fields=['weekday', 'prayer_time'], name='schedule_weekday_prayer_idx'),
+            # Mosque lookups for a given day (join back to Mosque + distinct)
+            models.Index(fields=['weekday', 'mosque'], name='schedule_weekday_mosque_idx'),
+            # Imam-centric lookups
+            models.Index(fields=['imam', 'weekday'], name='schedule_imam_weekday_idx'),
+            # Keyset pagination of the weekly schedule list
+            models.Index(fields=['weekday', 'id'], name='schedule_weekday_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.mosque.name} - {self.get_weekday_display()} - {self.get_prayer_time_display()}"
+
+
+class OutboxMessage(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    # Failed, retried at next_attempt_at
+    STATUS_FAILED = 'failed'
+    # Permanent error or out of attempts; listed on the dashboard
+    STATUS_DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'في الانتظار'),
+        (STATUS_SENDING, 'جاري الإرسال'),
+        (STATUS_SENT, 'تم الإرسال'),
+        (STATUS_FAILED, 'فشل الإرسال - ستتم إعادة المحاولة'),
+        (STATUS_DEAD, 'تعذر الإرسال'),
+    ]
+
+    KIND_CHOICES = [
+        ('today', 'تذكير يومي'),
+        ('weekly', 'تذكير أسبوعي'),
+        ('mosque', 'إشعار المساجد'),
+        ('weekly_mosque', 'إشعار أسبوعي للمساجد'),
+    ]
+
+    kind = models.CharField(_('Kind'), max_length=20, choices=KIND_CHOICES)
+    recipient_name = models.CharField(_('Recipient'), max_length=200, blank=True)
+    phone_number = models.CharField(_('Phone'), max_length=25)
+    message = models.TextField(_('Message'))
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    response = models.TextField(_('Response'), blank=True)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    claimed_at = models.DateTimeField(_('Claimed at'), null=True, blank=True)
+    sent_at = models.DateTimeField(_('Sent at'), null=True, blank=True)
+    next_attempt_at = models.DateTimeField(_('Next attempt at'), null=True, blank=True)
+    job = models.ForeignKey(
+        'BroadcastJob', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='messages', verbose_name=_('Broadcast'),
+    )
+
+    class Meta:
+        verbose_name = _('Outbox message')
+        verbose_name_plural = _('Outbox messages')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_name or self.phone_number} - {self.get_status_display()}"
+
+
+class BroadcastJob(models.Model):
+    """
+    The messages queued by one click on a send button
+
+    The page the operator came from follows the job's outbox messages as
+    the worker sends them (see dashboard.broadcasts).
+    """
+    kind = models.CharField(_('Kind'), max_length=20, choices=OutboxMessage.KIND_CHOICES)
+    label = models.CharField(_('Label'), max_length=200, blank=True)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Broadcast')
+        verbose_name_plural = _('Broadcasts')
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.label} - {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class Delivery(models.Model):
+    """
+    One reminder for one schedule on one date, whichever path sent it
+
+    Reminder runs (the broadcast buttons and send_daily_reminders) claim
+    their rows here before sending, so a re-run or a run racing another
+    skips everything that was already delivered or is still in flight.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'قيد الإرسال'),
+        (STATUS_SENT, 'تم الإرسال'),
+        (STATUS_FAILED, 'فشل الإرسال'),
+    ]
+
+    kind = models.CharField(_('Kind'), max_length=20, choices=OutboxMessage.KIND_CHOICES)
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, verbose_name=_('Schedule'))
+    target_date = models.DateField(_('Target date'))
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    response = models.TextField(_('Response'), blank=True)
+    outbox = models.ForeignKey(
+        OutboxMessage, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='deliveries', verbose_name=_('Outbox message'),
+    )
+    # Identifies the run holding a pending row
+    claim_token = models.CharField(max_length=32, blank=True, editable=False)
+    claimed_at = models.DateTimeField(_('Claimed at'), null=True, blank=True)
+    sent_at = models.DateTimeField(_('Sent at'), null=True, blank=True)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Delivery')
+        verbose_name_plural = _('Deliveries')
+        ordering = ['-target_date', 'id']
+        # Column order matters: runs look up every row of one kind and date range
+        unique_together = ['kind', 'target_date', 'schedule']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.schedule_id} - {self.target_date} - {self.get_status_display()}"
@@ -0,0 +1,276 @@
+import datetime
+import math
+import random
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from .deliveries import link_outbox, record_results
+from .models import OutboxMessage, Delivery
+from .whatsapp_web_service import estimated_wait
+
+
+OUTBOX_STATS_CACHE_KEY = 'dashboard:outbox_stats'
+DEAD_LETTERS_CACHE_KEY = 'dashboard:dead_letters'
+DEAD_LETTERS_SHOWN = 20
+
+# Send outcomes that fail the same way however often they are retried
+PERMANENT_OUTCOMES = {'not_registered'}
+
+
+def enqueue_messages(kind, items, deliveries=None, job=None):
+    """
+    Queue WhatsApp messages for the outbox worker
+
+    Args:
+        kind: One of OutboxMessage.KIND_CHOICES
+        items: Iterable of (recipient_name, phone_number, message) tuples
+        deliveries: Optional parallel list of the claimed Delivery ids each
+                    message carries; they are updated as the worker sends
+        job: Optional unsaved BroadcastJob; saved with the messages, and
+             only if there are any
+
+    Returns:
+        int: Number of queued messages
+    """
+    rows = [
+        OutboxMessage(kind=kind, recipient_name=name, phone_number=phone_number, message=message, job=job)
+        for name, phone_number, message in items
+    ]
+    with transaction.atomic():
+        if job is not None and rows:
+            job.save()
+        OutboxMessage.objects.bulk_create(rows, batch_size=500)
+        if deliveries:
+            link_outbox(rows, deliveries)
+    cache.delete(OUTBOX_STATS_CACHE_KEY)
+    return len(rows)
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait after the given number of failed attempts
+
+    Exponential backoff from OUTBOX_RETRY_BASE_DELAY, capped at
+    OUTBOX_RETRY_MAX_DELAY, with jitter: a random point in the upper half of
+    the interval so messages that failed together during an outage do not
+    all come back at the same moment.
+    """
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_DELAY', 60)
+    cap = getattr(settings, 'OUTBOX_RETRY_MAX_DELAY', 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def apply_result(outbox_message, result, now):
+    """Record one attempt: sent, failed with a retry scheduled, or dead"""
+    outbox_message.attempts += 1
+    outbox_message.response = result.message or ''
+    outbox_message.next_attempt_at = None
+
+    if result.success:
+        outbox_message.status = OutboxMessage.STATUS_SENT
+        outbox_message.sent_at = now
+    elif (result.outcome in PERMANENT_OUTCOMES
+          or outbox_message.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 6)):
+        outbox_message.status = OutboxMessage.STATUS_DEAD
+    else:
+        outbox_message.status = OutboxMessage.STATUS_FAILED
+        outbox_message.next_attempt_at = now + datetime.timedelta(seconds=retry_delay(outbox_message.attempts))
+
+
+def _delivery_status(outbox_message):
+    # Deliveries stay pending while the outbox still owns a retry
+    return {
+        OutboxMessage.STATUS_SENT: Delivery.STATUS_SENT,
+        OutboxMessage.STATUS_DEAD: Delivery.STATUS_FAILED,
+    }.get(outbox_message.status, Delivery.STATUS_PENDING)
+
+
+def enqueue_retries(kind, failures):
+    """
+    Hand messages that failed outside the worker over to the outbox
+
+    Transient failures are retried by the worker after the backoff delay;
+    permanent ones go straight to the dead letters.
+
+    Args:
+        kind: One of OutboxMessage.KIND_CHOICES
+        failures: Iterable of (recipient_name, phone_number, message,
+                  SendResult, delivery ids)
+
+    Returns:
+        tuple: (retrying_count, dead_count)
+    """
+    now = timezone.now()
+    rows = []
+    deliveries = []
+    for name, phone_number, message, result, delivery_ids in failures:
+        outbox_message = OutboxMessage(kind=kind, recipient_name=name, phone_number=phone_number, message=message)
+        apply_result(outbox_message, result, now)
+        rows.append(outbox_message)
+        deliveries.append(delivery_ids)
+    if not rows:
+        return 0, 0
+
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_create(rows, batch_size=500)
+        link_outbox(rows, deliveries)
+        record_results('outbox', [(m.id, _delivery_status(m), m.response) for m in rows])
+    cache.delete_many([OUTBOX_STATS_CACHE_KEY, DEAD_LETTERS_CACHE_KEY])
+
+    dead_count = sum(m.status == OutboxMessage.STATUS_DEAD for m in rows)
+    return len(rows) - dead_count, dead_count
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to batch_size messages that are due as sending and return them.
+
+    Due means pending, or failed with its retry time reached. Rows are
+    locked with SKIP LOCKED where the database supports it so that several
+    workers can drain the queue without picking the same message.
+    """
+    due = Q(status=OutboxMessage.STATUS_PENDING) | Q(
+        status=OutboxMessage.STATUS_FAILED, next_attempt_at__lte=timezone.now(),
+    )
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(id__in=ids).update(
+            status=OutboxMessage.STATUS_SENDING,
+            claimed_at=timezone.now(),
+        )
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def process_batch(whatsapp, batch_size=50):
+    """
+    Send one batch of due messages through WhatsAppWebService.send_batch
+
+    Failures are retried with backoff until OUTBOX_MAX_ATTEMPTS; permanent
+    errors (number not on WhatsApp) become dead letters at once. Messages
+    the service did not attempt because its circuit breaker opened go back
+    to the queue.
+
+    Returns:
+        tuple: (sent_count, failed_count, not_attempted_count)
+    """
+    sent_count = 0
+    failed_count = 0
+    not_attempted = []
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0, 0
+
+    results = whatsapp.send_batch([(m.phone_number, m.message) for m in batch])
+    finished = []
+    now = timezone.now()
+
+    for outbox_message, result in zip(batch, results):
+        if result.outcome == 'circuit_open':
+            not_attempted.append(outbox_message.id)
+            continue
+
+        apply_result(outbox_message, result, now)
+        if result.success:
+            sent_count += 1
+        else:
+            failed_count += 1
+        finished.append(outbox_message)
+
+    OutboxMessage.objects.bulk_update(finished, ['status', 'attempts', 'response', 'sent_at', 'next_attempt_at'])
+    record_results('outbox', [(m.id, _delivery_status(m), m.response) for m in finished])
+    if not_attempted:
+        OutboxMessage.objects.filter(id__in=not_attempted).update(status=OutboxMessage.STATUS_PENDING)
+    if any(m.status == OutboxMessage.STATUS_DEAD for m in finished):
+        cache.delete(DEAD_LETTERS_CACHE_KEY)
+
+    return sent_count, failed_count, len(not_attempted)
+
+
+def release_stale(older_than):
+    """Put messages left in 'sending' by a crashed worker back in the queue"""
+    return OutboxMessage.objects.filter(
+        status=OutboxMessage.STATUS_SENDING,
+        claimed_at__lt=older_than,
+    ).update(status=OutboxMessage.STATUS_PENDING)
+
+
+def dead_letters():
+    """
+    Most recent messages that will not be retried automatically
+
+    Cached for OUTBOX_STATS_TTL seconds, like queue_stats; cleared when
+    messages die or are requeued.
+    """
+    letters = cache.get(DEAD_LETTERS_CACHE_KEY)
+    if letters is None:
+        letters = list(OutboxMessage.objects.filter(status=OutboxMessage.STATUS_DEAD).order_by('-id')[:DEAD_LETTERS_SHOWN])
+        cache.set(DEAD_LETTERS_CACHE_KEY, letters, getattr(settings, 'OUTBOX_STATS_TTL', 5))
+    return letters
+
+
+def requeue_dead(ids=None):
+    """
+    Send dead letters again, e.g. after the number was registered on WhatsApp
+
+    Args:
+        ids: Outbox message ids, or None for every dead letter
+
+    Returns:
+        int: Number of requeued messages
+    """
+    with transaction.atomic():
+        dead = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_DEAD)
+        if ids is not None:
+            dead = dead.filter(id__in=ids)
+        ids = list(dead.values_list('id', flat=True))
+        OutboxMessage.objects.filter(id__in=ids).update(
+            status=OutboxMessage.STATUS_PENDING, attempts=0, next_attempt_at=None,
+        )
+        # Their deliveries are in flight again; keep reminder runs from sending them too
+        Delivery.objects.filter(outbox_id__in=ids, status=Delivery.STATUS_FAILED).update(
+            status=Delivery.STATUS_PENDING, claimed_at=timezone.now(),
+        )
+    cache.delete_many([OUTBOX_STATS_CACHE_KEY, DEAD_LETTERS_CACHE_KEY])
+    return len(ids)
+
+
+def queue_stats():
+    """
+    Queue depth and progress for messages queued today
+
+    Cached for OUTBOX_STATS_TTL seconds; enqueueing clears the cache.
+
+    Returns:
+        dict: counts per status ('retrying' = failed and waiting for a
+              retry) plus 'total', 'depth', 'progress' (percent) and
+              'eta_minutes' (time to send the queue at the endpoints' rate limits)
+    """
+    stats = cache.get(OUTBOX_STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    stats = OutboxMessage.objects.aggregate(
+        pending=Count('id', filter=Q(status=OutboxMessage.STATUS_PENDING)),
+        sending=Count('id', filter=Q(status=OutboxMessage.STATUS_SENDING)),
+        retrying=Count('id', filter=Q(status=OutboxMessage.STATUS_FAILED)),
+        sent=Count('id', filter=Q(status=OutboxMessage.STATUS_SENT, created_at__gte=today_start)),
+        dead=Count('id', filter=Q(status=OutboxMessage.STATUS_DEAD, created_at__gte=today_start)),
+    )
+    stats['depth'] = stats['pending'] + stats['sending'] + stats['retrying']
+    stats['total'] = stats['depth'] + stats['sent'] + stats['dead']
+    done = stats['sent'] + stats['dead']
+    stats['progress'] = int(done * 100 / stats['total']) if stats['total'] else 100
+    stats['eta_minutes'] = math.ceil(estimated_wait(stats['pending'] + stats['sending']) / 60)
+    cache.set(OUTBOX_STATS_CACHE_KEY, stats, getattr(settings, 'OUTBOX_STATS_TTL', 5))
+    return stats
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+
+# items: objects on this page; next_cursor: value for ?after= (None on the last page)
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'is_first'])
+
+
+def encode_cursor(segment, values):
+    data = json.dumps([segment, list(values)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (segment, values), or None if the cursor is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        segment, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(segment), list(values)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def _after(queryset, fields, values):
+    """Rows strictly after `values` in (field1, field2, ...) order"""
+    condition = Q()
+    equal = {}
+    for field, value in zip(fields, values):
+        condition |= Q(**equal, **{f'{field}__gt': value})
+        equal[field] = value
+    return queryset.filter(condition)
+
+
+def keyset_page(segments, fields, cursor=None, page_size=None):
+    """
+    Fetch one page by seeking past the last row of the previous page
+
+    Unlike OFFSET pagination every page costs the same: each query is an
+    index range scan starting at the cursor, so `fields` must end in a
+    unique column and be backed by an index.
+
+    Args:
+        segments: A queryset, or a list of querysets read one after the
+                  other (each ordered by `fields`); lets callers express
+                  wrap-around orderings such as "today's weekday first"
+                  without sorting the whole table
+        fields: Ascending ordering, e.g. ('name', 'id')
+        cursor: The next_cursor of the previous page (None for the first page)
+        page_size: Rows per page (default: LIST_PAGE_SIZE)
+
+    Returns:
+        KeysetPage
+    """
+    if isinstance(segments, QuerySet):
+        segments = [segments]
+    page_size = page_size or getattr(settings, 'LIST_PAGE_SIZE', 50)
+
+    position = decode_cursor(cursor)
+    if position is None or not 0 <= position[0] < len(segments) or len(position[1]) != len(fields):
+        position = (0, None)
+    start_segment, values = position
+
+    rows = []
+    for index in range(start_segment, len(segments)):
+        queryset = segments[index].order_by(*fields)
+        if index == start_segment and values is not None:
+            queryset = _after(queryset, fields, values)
+        # One extra row tells us whether there is a next page
+        rows.extend((index, item) for item in queryset[:page_size + 1 - len(rows)])
+        if len(rows) > page_size:
+            break
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_segment, last_item = rows[-1]
+        next_cursor = encode_cursor(last_segment, [getattr(last_item, field) for field in fields])
+
+    return KeysetPage([item for _, item in rows], next_cursor, values is None)
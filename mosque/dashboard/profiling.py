@@ -0,0 +1,32 @@
+import cProfile
+import datetime
+import re
+from pathlib import Path
+from django.conf import settings
+
+
+def profile_path(name):
+    """Build <PROFILE_DIR>/<name>-<timestamp>.prof, creating the directory if needed"""
+    directory = Path(getattr(settings, 'PROFILE_DIR', '/tmp/mosque_profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    safe_name = re.sub(r'[^\w.-]+', '_', name)
+    return directory / f'{safe_name}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}.prof'
+
+
+def profile_call(name, func, *args, **kwargs):
+    """
+    Run func under cProfile and dump the stats to PROFILE_DIR
+
+    The file is written even if func raises. Open it with
+    `python -m pstats <file>` or snakeviz.
+
+    Returns:
+        tuple: (func's return value, Path of the profile file)
+    """
+    profiler = cProfile.Profile()
+    path = profile_path(name)
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+    return result, path
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is only shared between threads
+    fcntl = None
+
+
+logger = logging.getLogger('dashboard.ratelimit')
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Send-rate limiter shared by every process on the host
+
+    The bucket state (tokens, timestamp) lives in a small file that is
+    updated under an exclusive flock, so gunicorn workers, the outbox worker
+    and cron runs of send_daily_reminders all draw from the same bucket.
+
+    A reservation may take the bucket below zero. The caller is told how
+    long to wait, and the debt delays the next reservation, which keeps the
+    long-run rate at `rate` however many processes are sending.
+    """
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _take(self, count):
+        """Refill the bucket, remove `count` tokens and return how many there were before"""
+        now = time.time()
+        try:
+            with self._lock, open(self.path, 'a+') as handle:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                handle.seek(0)
+                try:
+                    tokens, stamp = json.loads(handle.read())
+                except ValueError:
+                    tokens, stamp = self.burst, now
+                tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+                if count:
+                    handle.seek(0)
+                    handle.truncate()
+                    handle.write(json.dumps([tokens - count, now]))
+                return tokens
+        except OSError as e:
+            # Never block sending because the state file is unusable
+            logger.warning('Rate limiter disabled, cannot use %s: %s', self.path, e)
+            return self.burst
+
+    def reserve(self, count=1):
+        """
+        Reserve `count` send slots
+
+        Returns:
+            float: Seconds to wait before the first of them may start
+        """
+        if not self.enabled:
+            return 0.0
+        tokens = self._take(count)
+        return max(0.0, (1 - tokens) / self.rate)
+
+    def acquire(self, count=1):
+        """Reserve `count` slots and sleep until the first one; returns the seconds waited"""
+        wait = self.reserve(count)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def estimate(self, count):
+        """Seconds until `count` more messages could have started, without reserving anything"""
+        if not self.enabled or count <= 0:
+            return 0.0
+        return max(0.0, (count - self._take(0)) / self.rate)
+
+
+def get_limiter(name=None):
+    """
+    Return the process-wide limiter configured by WHATSAPP_RATE_LIMIT / WHATSAPP_RATE_BURST
+
+    Args:
+        name: Optional bucket name (e.g. one per WhatsApp session); each name
+              gets its own state file next to WHATSAPP_RATE_LIMIT_FILE
+    """
+    path = getattr(settings, 'WHATSAPP_RATE_LIMIT_FILE', '/tmp/mosque_whatsapp_rate')
+    if name:
+        path = f'{path}-{hashlib.blake2b(name.encode(), digest_size=4).hexdigest()}'
+    rate = getattr(settings, 'WHATSAPP_RATE_LIMIT', 1.0)
+    burst = getattr(settings, 'WHATSAPP_RATE_BURST', 5)
+    key = (path, rate, burst)
+    with _limiters_lock:
+        if key not in _limiters:
+            directory = os.path.dirname(path)
+            if directory:
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                except OSError:
+                    pass  # reported by the limiter on first use
+            _limiters[key] = TokenBucket(path, rate, burst)
+        return _limiters[key]
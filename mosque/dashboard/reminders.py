@@ -0,0 +1,91 @@
+from django.conf import settings
+from .models import Schedule
+
+
+CLOSING = "عند الانتهاء من إلقاء الكلمة يرجى إرسال رسالة:\n\"تم الانتهاء من إلقاء الكلمة\"\n\nجزاك الله خيراً"
+
+PRAYER_ORDER = {code: index for index, (code, _) in enumerate(Schedule.PRAYER_TIME_CHOICES)}
+
+
+def coalesce_enabled():
+    return getattr(settings, 'COALESCE_REMINDERS', True)
+
+
+def group_by_imam(schedules, coalesce=True):
+    """
+    Split schedules into one group per message
+
+    With coalesce, all schedules of the same imam share a group (in the
+    order the imams first appear); otherwise every schedule is its own group.
+
+    Returns:
+        list: Lists of schedules
+    """
+    if not coalesce:
+        return [[schedule] for schedule in schedules]
+    groups = {}
+    for schedule in schedules:
+        groups.setdefault(schedule.imam_id, []).append(schedule)
+    return list(groups.values())
+
+
+def imam_reminder(schedule, hijri_date_str, sender_notes=''):
+    """Reminder for a single booking, as sent by the dashboard buttons"""
+    mosque = schedule.mosque
+    prayer_time_display = dict(Schedule.PRAYER_TIME_CHOICES).get(schedule.prayer_time)
+    weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(schedule.weekday)
+
+    message = f"""السلام عليكم ورحمة الله وبركاته
+
+تذكير: لديك موعد إلقاء كلمة يوم {weekday_display}
+🕌 المسجد: {mosque.name}
+📍 الموقع: {mosque.address}
+📅 التاريخ الهجري: {hijri_date_str}
+🕌 الصلاة: {prayer_time_display}"""
+
+    # Add mosque phone number if available
+    if mosque.phone:
+        message += f"\n📞 هاتف المسجد: {mosque.get_full_phone()}"
+
+    # Add schedule notes if available
+    if schedule.notes:
+        message += f"\n📝 ملاحظات: {schedule.notes}"
+
+    if sender_notes:
+        message += f"\n📝 ملاحظة إضافية: {sender_notes}"
+
+    return message + "\n\n" + CLOSING
+
+
+def combined_imam_reminder(schedules, dates, sender_notes=None):
+    """
+    One reminder listing several bookings of the same caller, day by day
+
+    Args:
+        schedules: Schedules of one imam
+        dates: {weekday: (date, hijri date string)}, as returned by week_dates()
+        sender_notes: Optional {schedule id: extra note from the sender}
+    """
+    sender_notes = sender_notes or {}
+    weekdays = dict(Schedule.WEEKDAY_CHOICES)
+    prayer_times = dict(Schedule.PRAYER_TIME_CHOICES)
+    ordered = sorted(schedules, key=lambda s: (dates[s.weekday][0], PRAYER_ORDER.get(s.prayer_time, 0)))
+
+    message = "السلام عليكم ورحمة الله وبركاته\n\nتذكير: لديك المواعيد التالية لإلقاء الكلمة\n"
+    current_weekday = None
+    for schedule in ordered:
+        mosque = schedule.mosque
+        if schedule.weekday != current_weekday:
+            current_weekday = schedule.weekday
+            message += f"\n📅 {weekdays.get(schedule.weekday)} - {dates[schedule.weekday][1]}\n"
+
+        message += f"🕌 {prayer_times.get(schedule.prayer_time)}: {mosque.name}\n"
+        message += f"📍 الموقع: {mosque.address}\n"
+        if mosque.phone:
+            message += f"📞 هاتف المسجد: {mosque.get_full_phone()}\n"
+        if schedule.notes:
+            message += f"📝 ملاحظات: {schedule.notes}\n"
+        if sender_notes.get(schedule.id):
+            message += f"📝 ملاحظة إضافية: {sender_notes[schedule.id]}\n"
+
+    return message + "\n" + CLOSING
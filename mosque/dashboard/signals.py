@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Mosque, Imam, Schedule
+from .stats import invalidate_home_stats
+
+
+@receiver(post_save, sender=Mosque)
+@receiver(post_save, sender=Imam)
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Mosque)
+@receiver(post_delete, sender=Imam)
+@receiver(post_delete, sender=Schedule)
+def clear_home_stats(sender, **kwargs):
+    """Drop the cached home page statistics whenever the underlying data changes"""
+    invalidate_home_stats()
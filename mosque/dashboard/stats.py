@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from .models import Mosque, Imam, Schedule
+
+
+HOME_STATS_CACHE_KEY = 'dashboard:home_stats'
+
+
+def _table_counts():
+    """Count mosques, imams and schedules in a single query"""
+    quote = connection.ops.quote_name
+    subqueries = ', '.join(
+        f'(SELECT COUNT(*) FROM {quote(model._meta.db_table)})'
+        for model in (Mosque, Imam, Schedule)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {subqueries}')
+        return cursor.fetchone()
+
+
+def home_stats():
+    """
+    Statistics shown on the dashboard home page
+
+    Cached until a Mosque, Imam or Schedule is saved or deleted
+    (see dashboard.signals).
+
+    Returns:
+        dict: mosque_count, imam_count, schedule_count and schedule_by_day,
+              a list of (weekday, weekday display, count) for every weekday
+    """
+    stats = cache.get(HOME_STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    mosque_count, imam_count, schedule_count = _table_counts()
+
+    day_counts = dict(
+        Schedule.objects.order_by()
+        .values('weekday')
+        .annotate(count=Count('id'))
+        .values_list('weekday', 'count')
+    )
+    schedule_by_day = [
+        (weekday, weekday_display, day_counts.get(weekday, 0))
+        for weekday, weekday_display in Schedule.WEEKDAY_CHOICES
+    ]
+
+    stats = {
+        'mosque_count': mosque_count,
+        'imam_count': imam_count,
+        'schedule_count': schedule_count,
+        'schedule_by_day': schedule_by_day,
+    }
+    cache.set(HOME_STATS_CACHE_KEY, stats, None)
+    return stats
+
+
+def invalidate_home_stats():
+    cache.delete(HOME_STATS_CACHE_KEY)
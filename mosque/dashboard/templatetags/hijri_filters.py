@@ -1,5 +1,5 @@
 from django import template
-from hijri_converter import Gregorian
+from dashboard.hijri import hijri_date_str
 import datetime
 
 register = template.Library()
@@ -10,16 +10,7 @@ def to_hijri(date):
     if not date:
         return ''
     
-    if isinstance(date, datetime.datetime):
-        date = date.date()
-    
-    hijri_date = Gregorian(date.year, date.month, date.day).to_hijri()
-    hijri_months = [
-        'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-        'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-    ]
-    hijri_month_name = hijri_months[hijri_date.month - 1]
-    return f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
+    return hijri_date_str(date)
 
 @register.simple_tag
 def today_hijri():
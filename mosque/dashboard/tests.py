@@ -1,3 +1,1071 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from . import whatsapp_web_service
+from .hijri import model_weekday
+from .importer import import_csv
+from .management.commands.send_daily_reminders import Pacer
+from .models import Mosque, Imam, Schedule, OutboxMessage, Delivery, BroadcastJob
+from .outbox import (
+    DEAD_LETTERS_CACHE_KEY, OUTBOX_STATS_CACHE_KEY, dead_letters, enqueue_messages, process_batch, requeue_dead,
+)
+from .ratelimit import TokenBucket
+from .stats import HOME_STATS_CACHE_KEY, home_stats
+from .whatsapp_web_service import WhatsAppWebService, SendResult, CircuitBreaker, rank_endpoints
+
+
+class MosqueBroadcastQueryCountTests(TestCase):
+    """The mosque broadcast views must not issue one query per mosque"""
+
+    def setUp(self):
+        patcher = mock.patch('dashboard.views.whatsapp_ready', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.imam = Imam.objects.create(name='Imam', phone='501234567')
+
+    def create_mosques(self, count):
+        for index in range(count):
+            mosque = Mosque.objects.create(name=f'Mosque {index}', address='Address', phone=f'5000{index}')
+            Schedule.objects.create(mosque=mosque, imam=self.imam, weekday=2, prayer_time='fajr')
+            Schedule.objects.create(mosque=mosque, imam=self.imam, weekday=2, prayer_time='isha')
+            Schedule.objects.create(mosque=mosque, imam=self.imam, weekday=4, prayer_time='asr')
+
+    def count_queries(self, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def assert_constant_queries(self, url, data):
+        self.create_mosques(2)
+        small = self.count_queries(url, data)
+        OutboxMessage.objects.all().delete()
+
+        self.create_mosques(20)
+        large = self.count_queries(url, data)
+
+        self.assertEqual(small, large)
+        # mosques + prefetched schedules/imams, delivery claim (insert, re-claim,
+        # select) and broadcast job + outbox insert + delivery link, each in a savepoint
+        self.assertEqual(large, 12)
+
+    def test_send_mosque_notification(self):
+        self.assert_constant_queries(reverse('send_mosque_notification'), {'target_weekday': 2})
+        # The two mosques notified by the first request are not notified again
+        self.assertEqual(OutboxMessage.objects.filter(kind='mosque').count(), 20)
+
+    def test_send_weekly_mosque_reminders(self):
+        self.assert_constant_queries(reverse('send_weekly_mosque_reminders'), {})
+        outbox_message = OutboxMessage.objects.filter(kind='weekly_mosque').first()
+        self.assertIn('الفجر', outbox_message.message)
+        self.assertIn('العصر', outbox_message.message)
+
+
+class HomeStatsCacheTests(TestCase):
+    """Home page counts are cached and dropped when mosques, callers or schedules change"""
+
+    def setUp(self):
+        cache.delete(HOME_STATS_CACHE_KEY)
+        self.addCleanup(cache.delete, HOME_STATS_CACHE_KEY)
+        self.mosque = Mosque.objects.create(name='Mosque', address='Address')
+        self.imam = Imam.objects.create(name='Imam', phone='501234567')
+
+    def test_cached_until_data_changes(self):
+        self.assertEqual(home_stats()['mosque_count'], 1)
+        with self.assertNumQueries(0):
+            home_stats()
+
+        schedule = Schedule.objects.create(mosque=self.mosque, imam=self.imam, weekday=2, prayer_time='fajr')
+        stats = home_stats()
+        self.assertEqual(stats['schedule_count'], 1)
+        self.assertEqual(stats['schedule_by_day'][2][2], 1)
+
+        schedule.delete()
+        self.assertEqual(home_stats()['schedule_count'], 0)
+        Imam.objects.create(name='Imam 2', phone='501234568')
+        self.assertEqual(home_stats()['imam_count'], 2)
+
+    def test_warm_home_page_runs_no_queries(self):
+        cache.delete_many([OUTBOX_STATS_CACHE_KEY, DEAD_LETTERS_CACHE_KEY])
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_dead_letters_refresh_when_messages_die_or_are_requeued(self):
+        message = OutboxMessage.objects.create(kind='today', recipient_name='Imam', phone_number='+966501', message='Hi')
+        cache.delete(DEAD_LETTERS_CACHE_KEY)
+        self.assertEqual(dead_letters(), [])
+
+        whatsapp = mock.Mock()
+        whatsapp.send_batch.return_value = [SendResult(False, 'not on WhatsApp', 'not_registered')]
+        process_batch(whatsapp)
+        self.assertEqual(dead_letters(), [message])
+
+        requeue_dead()
+        self.assertEqual(dead_letters(), [])
+
+
+class ScheduleIndexExplainTests(TestCase):
+    """The planner should use the weekday/name indexes on a realistic dataset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # The volumes run_benchmarks is meant for; at a few hundred rows a
+        # sequential scan is the right plan and the test would prove nothing
+        call_command('seed_benchmark_data', mosques=10000, imams=5000, schedules=70000, stdout=io.StringIO())
+        # Fresh statistics, so the planner sees the real row counts and value spread
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.imam = Imam.objects.order_by('id').first()
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """The plan uses one of `index_names`, chosen by the planner itself"""
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), msg=f'{" / ".join(index_names)} not used:\n{plan}')
+
+    def test_weekday_and_prayer_time(self):
+        queryset = Schedule.objects.filter(weekday=2, prayer_time='fajr').order_by('prayer_time')
+        self.assertUsesIndex(queryset, 'schedule_weekday_prayer_idx')
+
+    def test_mosques_for_weekday(self):
+        queryset = Schedule.objects.filter(weekday=3).values('mosque').distinct()
+        # Postgres only prefers (weekday, mosque) for an index-only scan, which needs
+        # a VACUUM that cannot run inside the test transaction; until then any
+        # weekday-leading index serves the filter equally well
+        self.assertUsesIndex(
+            queryset, 'schedule_weekday_mosque_idx', 'schedule_weekday_prayer_idx', 'schedule_weekday_id_idx',
+        )
+
+    def test_imam_for_weekday(self):
+        queryset = Schedule.objects.filter(imam=self.imam, weekday=4)
+        self.assertUsesIndex(queryset, 'schedule_imam_weekday_idx')
+
+    def test_mosque_name_ordering(self):
+        self.assertUsesIndex(Mosque.objects.order_by('name')[:20], 'mosque_name_idx')
+
+    def test_imam_name_ordering(self):
+        self.assertUsesIndex(Imam.objects.order_by('name')[:20], 'imam_name_idx')
+
+    def test_schedule_list_page(self):
+        page_query = Schedule.objects.filter(weekday__gte=3).order_by('weekday', 'id')[:51]
+        self.assertUsesIndex(page_query, 'schedule_weekday_id_idx')
+
+
+class WeekdayParameterTests(TestCase):
+    """Weekday parameters outside 0-6 wrap around instead of failing"""
+
+    def setUp(self):
+        patcher = mock.patch('dashboard.views.whatsapp_ready', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_wrap_weekday(self):
+        for url in (reverse('today_schedule'), reverse('mosque_schedules')):
+            response = self.client.get(url, {'weekday': 9})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['target_weekday'], 2)
+
+    def test_broadcasts_wrap_weekday(self):
+        for url in (reverse('send_today_reminders'), reverse('send_mosque_notification')):
+            response = self.client.post(url, {'target_weekday': -1})
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('weekday=6', response['Location'])
+
+
+class SeedBenchmarkDataCommandTests(TestCase):
+    """seed_benchmark_data spreads the schedules over every weekday"""
+
+    def test_every_weekday_gets_schedules(self):
+        call_command('seed_benchmark_data', mosques=50, imams=5, schedules=70, stdout=io.StringIO())
+        per_weekday = dict(Schedule.objects.values_list('weekday').annotate(count=Count('id')))
+        self.assertEqual(per_weekday, {weekday: 10 for weekday in range(7)})
+
+    def test_fills_every_slot_of_a_mosque(self):
+        call_command('seed_benchmark_data', mosques=3, imams=2, schedules=105, stdout=io.StringIO())
+        self.assertEqual(Schedule.objects.count(), 105)
+
+
+class RunBenchmarksCommandTests(TestCase):
+    """run_benchmarks times every dashboard URL, including the pk routes"""
+
+    def test_command_writes_results(self):
+        imam = Imam.objects.create(name='Imam', phone='501234567')
+        mosque = Mosque.objects.create(name='Mosque', address='Address')
+        Schedule.objects.create(mosque=mosque, imam=imam, weekday=0, prayer_time='fajr')
+        job = BroadcastJob.objects.create(kind='today')
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            with mock.patch.object(whatsapp_web_service, 'start_health_checks') as start_health_checks:
+                call_command('run_benchmarks', repeat=1, output=str(output), stdout=io.StringIO())
+            results = {result['name']: result for result in json.loads(output.read_text())['results']}
+
+        self.assertEqual(results['broadcast_events']['url'], reverse('broadcast_events', args=[job.pk]))
+        self.assertEqual(results['mosque_update']['status'], 200)
+        self.assertIn('send_daily_reminders --test', results)
+        # The broadcasts were measured on the queueing path, not the "not ready" redirect
+        self.assertGreater(results['send_today_reminders']['queries'], 0)
+        start_health_checks.assert_not_called()
+
+
+class KeysetPaginationTests(TestCase):
+    """List pages seek past the previous page instead of loading every row"""
+
+    def collect_pages(self, url_name, context_name):
+        names, cursor = [], None
+        while True:
+            response = self.client.get(reverse(url_name), {'after': cursor} if cursor else {})
+            names.extend(response.context[context_name])
+            cursor = response.context['page'].next_cursor
+            if cursor is None:
+                return names
+
+    @override_settings(LIST_PAGE_SIZE=4)
+    def test_mosque_pages_cover_every_row_once(self):
+        for index in range(10):
+            # Duplicate names exercise the id tie-breaker
+            Mosque.objects.create(name=f'Mosque {index % 3}', address='Address')
+
+        mosques = self.collect_pages('mosque_list', 'mosques')
+
+        self.assertEqual(
+            [mosque.pk for mosque in mosques],
+            list(Mosque.objects.order_by('name', 'id').values_list('pk', flat=True)),
+        )
+
+    @override_settings(LIST_PAGE_SIZE=3)
+    def test_schedule_pages_start_at_today(self):
+        imam = Imam.objects.create(name='Imam', phone='501234567')
+        for weekday in range(7):
+            mosque = Mosque.objects.create(name=f'Mosque {weekday}', address='Address')
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=weekday, prayer_time='fajr')
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=weekday, prayer_time='asr')
+
+        today = model_weekday(datetime.date.today())
+        schedules = self.collect_pages('schedule_list', 'schedules')
+
+        weekdays = [schedule.weekday for schedule in schedules]
+        self.assertEqual(len(weekdays), 14)
+        self.assertEqual(weekdays, sorted(weekdays, key=lambda weekday: (weekday - today) % 7))
+
+    def test_malformed_cursor_shows_first_page(self):
+        Imam.objects.create(name='Imam', phone='501234567')
+
+        response = self.client.get(reverse('imam_list'), {'after': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page'].is_first)
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    """Every response reports its SQL/template/WhatsApp time"""
+
+    def setUp(self):
+        Mosque.objects.create(name='Mosque', address='Address')
+
+    def test_server_timing_header(self):
+        with self.assertLogs('dashboard.timing', 'INFO') as logs:
+            response = self.client.get(reverse('mosque_list'))
+
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'whatsapp;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertNotIn('"sql"', logs.output[0])
+
+    @override_settings(REQUEST_TIME_BUDGET_MS=-1)
+    def test_over_budget_logs_sql(self):
+        with self.assertLogs('dashboard.timing', 'WARNING') as logs:
+            self.client.get(reverse('mosque_list'))
+
+        self.assertIn('"sql"', logs.output[0])
+        self.assertIn('dashboard_mosque', logs.output[0])
+
+
+@override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1'], WHATSAPP_HEALTH_INTERVAL=0, WHATSAPP_RATE_LIMIT=0)
+class MetricsTests(TestCase):
+    """/metrics exposes request, WhatsApp and outbox metrics in the Prometheus format"""
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_counted(self):
+        before = self.sample('dashboard_request_duration_seconds_count', view='mosque_list', method='GET')
+        self.client.get(reverse('mosque_list'))
+        self.assertEqual(self.sample('dashboard_request_duration_seconds_count', view='mosque_list', method='GET'), before + 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('dashboard_request_duration_seconds_count{method="GET",view="mosque_list"}', body)
+        self.assertIn('dashboard_outbox_depth 0.0', body)
+
+    def test_send_outcomes_are_counted(self):
+        sent = self.sample('dashboard_whatsapp_messages_total', outcome='sent')
+        not_registered = self.sample('dashboard_whatsapp_messages_total', outcome='not_registered')
+        batches = self.sample('dashboard_whatsapp_send_duration_seconds_count', endpoint='send-batch')
+
+        with mock.patch.dict(whatsapp_web_service._breakers, clear=True), \
+                mock.patch.object(WhatsAppWebService, 'is_ready', return_value=True):
+            whatsapp = WhatsAppWebService()
+            whatsapp.session = mock.Mock()
+            whatsapp.session.post.return_value = mock.Mock(status_code=200, json=mock.Mock(return_value={'results': [
+                {'success': True}, {'success': True}, {'success': False, 'status': 400, 'error': 'not on WhatsApp'},
+            ]}))
+            whatsapp.send_batch([('966500000000', 'a'), ('966500000001', 'b'), ('966500000002', 'c')])
+
+        self.assertEqual(self.sample('dashboard_whatsapp_messages_total', outcome='sent'), sent + 2)
+        self.assertEqual(self.sample('dashboard_whatsapp_messages_total', outcome='not_registered'), not_registered + 1)
+        self.assertEqual(self.sample('dashboard_whatsapp_send_duration_seconds_count', endpoint='send-batch'), batches + 1)
+
+    @override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1', 'http://wa-2'], WHATSAPP_BATCH_SIZE=5)
+    def test_failed_over_messages_are_counted_once(self):
+        sent = self.sample('dashboard_whatsapp_messages_total', outcome='sent')
+        connection_errors = self.sample('dashboard_whatsapp_messages_total', outcome='connection_error')
+
+        def send_chunk(service, url, chunk):
+            outcome = 'connection_error' if url == 'http://wa-1' else 'sent'
+            return [SendResult(outcome == 'sent', outcome, outcome) for _ in chunk]
+
+        messages = [(f'9665000000{i:02d}', 'hi') for i in range(40)]
+        with mock.patch.dict(whatsapp_web_service._breakers, clear=True), \
+                mock.patch.dict(whatsapp_web_service._readiness, clear=True), \
+                mock.patch.object(WhatsAppWebService, '_send_chunk', autospec=True, side_effect=send_chunk):
+            results = WhatsAppWebService().send_batch(messages)
+
+        self.assertEqual({result.outcome for result in results}, {'sent'})
+        self.assertEqual(self.sample('dashboard_whatsapp_messages_total', outcome='sent'), sent + 40)
+        self.assertEqual(self.sample('dashboard_whatsapp_messages_total', outcome='connection_error'), connection_errors)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """?profile=1 writes a cProfile dump for staff users only"""
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = Path(profile_dir.name)
+        override = override_settings(PROFILE_DIR=profile_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_staff_request_is_profiled(self):
+        staff = User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('mosque_list'), {'profile': 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Profile-File'].startswith('mosque_list-'))
+        self.assertTrue((self.profile_dir / response['X-Profile-File']).exists())
+
+    def test_async_view_reports_skip(self):
+        staff = User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        job = BroadcastJob.objects.create(kind='today')
+
+        response = self.client.get(reverse('broadcast_events', args=[job.pk]), {'profile': 1})
+
+        self.assertEqual(response['X-Profile-Skipped'], 'async view')
+        self.assertNotIn('X-Profile-File', response)
+
+    def test_anonymous_request_is_not_profiled(self):
+        response = self.client.get(reverse('mosque_list'), {'profile': 1})
+
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+
+class ExportTests(TestCase):
+    """Schedule and contact exports stream their rows"""
+
+    def setUp(self):
+        imam = Imam.objects.create(name='Imam', phone='501234567', email='imam@example.com')
+        mosque = Mosque.objects.create(name='Mosque', address='Address', phone='112345678')
+        Schedule.objects.create(mosque=mosque, imam=imam, weekday=1, prayer_time='asr', notes='Line 1\nLine 2')
+
+    def test_schedule_csv(self):
+        response = self.client.get(reverse('schedule_export'), {'format': 'csv'})
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2:], [
+            'الأحد', 'العصر', 'Mosque', 'Address', '+966112345678', 'Imam', '+966501234567', 'Line 1\nLine 2',
+        ])
+
+    def test_contact_xlsx(self):
+        response = self.client.get(reverse('contact_export'), {'format': 'xlsx'})
+
+        self.assertTrue(response.streaming)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 3)
+        self.assertIn('+966501234567', sheet)
+        self.assertIn('imam@example.com', sheet)
+
+
+class ImportTests(TestCase):
+    """Bulk CSV import validates every row and respects Schedule's unique_together"""
+
+    def setUp(self):
+        self.mosque = Mosque.objects.create(name='Mosque', address='Address')
+        self.imam = Imam.objects.create(name='Imam', phone='501234567')
+        Imam.objects.create(name='Other', phone='507654321')
+
+    def run_import(self, kind, text, **kwargs):
+        return import_csv(kind, io.StringIO(text), **kwargs)
+
+    def test_schedules_create_and_update(self):
+        Schedule.objects.create(mosque=self.mosque, imam=self.imam, weekday=0, prayer_time='fajr')
+
+        result = self.run_import('schedules', (
+            'mosque,imam,weekday,prayer_time,notes\n'
+            'Mosque,Other,السبت,الفجر,Updated\n'
+            'Mosque,Imam,3,isha,\n'
+        ))
+
+        self.assertEqual((result.created, result.updated, result.errors), (1, 1, []))
+        schedule = Schedule.objects.get(mosque=self.mosque, weekday=0, prayer_time='fajr')
+        self.assertEqual((schedule.imam.name, schedule.notes), ('Other', 'Updated'))
+
+    def test_row_errors_roll_back(self):
+        result = self.run_import('schedules', (
+            'mosque,imam,weekday,prayer_time\n'
+            'Mosque,Imam,1,asr\n'
+            'Mosque,Imam,1,asr\n'
+            'Missing,Imam,1,asr\n'
+            'Mosque,Imam,9,asr\n'
+        ))
+
+        self.assertTrue(result.rolled_back)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_mosques_skip_invalid(self):
+        result = self.run_import('mosques', (
+            'name,address,country_code,phone\n'
+            'Mosque,New address,,\n'
+            'New mosque,Address,+971,501\n'
+            'No address,,,\n'
+        ), skip_invalid=True)
+
+        self.assertEqual((result.created, result.updated, len(result.errors)), (1, 1, 1))
+        self.assertEqual(Mosque.objects.get(pk=self.mosque.pk).address, 'New address')
+        self.assertEqual(Mosque.objects.get(name='New mosque').get_full_phone(), '+971501')
+
+
+class DeliveryLedgerTests(TestCase):
+    """Reminder runs record deliveries and never send the same reminder twice"""
+
+    def setUp(self):
+        # The views read the polled status snapshot, the command asks the service
+        for patcher in (mock.patch('dashboard.views.whatsapp_ready', return_value=True),
+                        mock.patch.object(WhatsAppWebService, 'is_ready', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        mosque = Mosque.objects.create(name='Mosque', address='Address')
+        weekday = model_weekday(datetime.date.today())
+        for index, prayer_time in enumerate(['fajr', 'isha']):
+            imam = Imam.objects.create(name=f'Imam {index}', phone=f'50000000{index}')
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=weekday, prayer_time=prayer_time)
+
+    def test_command_resumes_failed_reminders(self):
+        def send_batch(service, messages):
+            return [
+                SendResult(True, 'sent', 'sent') if phone.endswith('0') else SendResult(False, 'not registered', 'not_registered')
+                for phone, _ in messages
+            ]
+
+        with mock.patch.object(WhatsAppWebService, 'send_batch', autospec=True, side_effect=send_batch) as send:
+            call_command('send_daily_reminders', rate=0, stdout=io.StringIO())
+            call_command('send_daily_reminders', rate=0, stdout=io.StringIO())
+
+        self.assertEqual([len(call.args[1]) for call in send.call_args_list], [2, 1])
+        self.assertEqual(send.call_args_list[1].args[1][0][0], '+966500000001')
+        failed = Delivery.objects.get(status=Delivery.STATUS_FAILED)
+        self.assertEqual((failed.attempts, failed.response), (2, 'not registered'))
+        self.assertEqual(Delivery.objects.filter(status=Delivery.STATUS_SENT).count(), 1)
+
+    def test_outbox_worker_settles_queued_deliveries(self):
+        data = {'target_weekday': model_weekday(datetime.date.today())}
+        self.client.post(reverse('send_today_reminders'), data)
+        self.client.post(reverse('send_today_reminders'), data)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        whatsapp = mock.Mock()
+        whatsapp.send_batch.return_value = [SendResult(True, 'ok', 'sent')] * 2
+        process_batch(whatsapp)
+
+        self.assertEqual(
+            list(Delivery.objects.values_list('kind', 'status', 'attempts')),
+            [('today', Delivery.STATUS_SENT, 1)] * 2,
+        )
+
+
+class BroadcastJobTests(TestCase):
+    """A queued broadcast is followed on the page through its Server-Sent Events"""
+
+    def setUp(self):
+        patcher = mock.patch('dashboard.views.whatsapp_ready', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mosque = Mosque.objects.create(name='Mosque', address='Address')
+        self.weekday = model_weekday(datetime.date.today())
+        for index, prayer_time in enumerate(['fajr', 'isha']):
+            imam = Imam.objects.create(name=f'Imam {index}', phone=f'50000000{index}')
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=self.weekday, prayer_time=prayer_time)
+
+    def events(self, job):
+        response = self.client.get(reverse('broadcast_events', args=[job.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        return [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.split('\n\n') if block.startswith('event: ')
+        ]
+
+    def test_progress_events(self):
+        response = self.client.post(reverse('send_today_reminders'), {'target_weekday': self.weekday})
+        job = BroadcastJob.objects.get()
+        self.assertIn(f'job={job.pk}', response['Location'])
+        self.assertEqual(job.messages.count(), 2)
+
+        events = self.events(job)
+        self.assertEqual([name for name, _ in events], ['result', 'result', 'totals'])
+        self.assertEqual(events[-1][1]['pending'], 2)
+        self.assertFalse(events[-1][1]['done'])
+
+        job.messages.update(status=OutboxMessage.STATUS_SENT)
+        events = self.events(job)
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['sent'], 2)
+
+        page = self.client.get(response['Location'])
+        self.assertContains(page, reverse('broadcast_events', args=[job.pk]))
+
+    def test_unknown_job(self):
+        response = self.client.get(reverse('broadcast_events', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ProcessOutboxCommandTests(TestCase):
+    """process_outbox claims due messages in batches, sends them and records the outcome"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(whatsapp_web_service._breakers, clear=True),
+                        mock.patch.object(WhatsAppWebService, 'is_ready', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        enqueue_messages('today', [(f'Imam {i}', f'96650000000{i}', f'message {i}') for i in range(3)])
+
+    def test_once_drains_the_queue(self):
+        def send_batch(service, messages):
+            return [
+                SendResult(False, 'timeout', 'timeout') if phone.endswith('2') else SendResult(True, 'ok', 'sent')
+                for phone, _ in messages
+            ]
+
+        stale = OutboxMessage.objects.create(
+            kind='today', recipient_name='Stale', phone_number='966500000009', message='stale',
+            status=OutboxMessage.STATUS_SENDING, claimed_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        with mock.patch.object(WhatsAppWebService, 'send_batch', autospec=True, side_effect=send_batch) as send:
+            call_command('process_outbox', once=True, batch_size=2, stdout=io.StringIO())
+
+        # The stale message was requeued and sent along with the others
+        self.assertEqual([len(call.args[1]) for call in send.call_args_list], [2, 2])
+        statuses = dict(OutboxMessage.objects.values_list('phone_number', 'status'))
+        self.assertEqual(statuses, {
+            '966500000000': OutboxMessage.STATUS_SENT,
+            '966500000001': OutboxMessage.STATUS_SENT,
+            '966500000002': OutboxMessage.STATUS_FAILED,
+            stale.phone_number: OutboxMessage.STATUS_SENT,
+        })
+        failed = OutboxMessage.objects.get(status=OutboxMessage.STATUS_FAILED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+
+    def test_not_ready_sends_nothing(self):
+        with mock.patch.object(WhatsAppWebService, 'is_ready', return_value=False), \
+                mock.patch.object(WhatsAppWebService, 'send_batch') as send:
+            call_command('process_outbox', once=True, stdout=io.StringIO())
+
+        send.assert_not_called()
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).count(), 3)
+
+
+@override_settings(OUTBOX_RETRY_BASE_DELAY=60, OUTBOX_MAX_ATTEMPTS=3)
+class OutboxRetryTests(TestCase):
+    """Transient failures are retried with backoff; permanent ones become dead letters"""
+
+    def setUp(self):
+        self.message = OutboxMessage.objects.create(kind='today', recipient_name='Imam', phone_number='+966501', message='Hi')
+        self.whatsapp = mock.Mock()
+
+    def send(self, result):
+        self.whatsapp.send_batch.return_value = [result]
+        return process_batch(self.whatsapp)
+
+    def test_timeout_is_retried_after_backoff(self):
+        self.send(SendResult(False, 'timeout', 'timeout'))
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, OutboxMessage.STATUS_FAILED)
+        delay = (self.message.next_attempt_at - timezone.now()).total_seconds()
+        self.assertTrue(25 <= delay <= 60, delay)
+
+        # Not due yet
+        self.assertEqual(self.send(SendResult(True, 'ok', 'sent')), (0, 0, 0))
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        self.send(SendResult(False, 'timeout', 'timeout'))
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        self.send(SendResult(False, 'timeout', 'timeout'))
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxMessage.STATUS_DEAD, 3))
+
+    def test_not_registered_is_dead_lettered_and_can_be_requeued(self):
+        self.send(SendResult(False, 'Phone number is not registered on WhatsApp', 'not_registered'))
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxMessage.STATUS_DEAD, 1))
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Phone number is not registered on WhatsApp')
+
+        self.client.post(reverse('outbox_requeue'), {'message_id': self.message.id})
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxMessage.STATUS_PENDING, 0))
+
+
+class CoalescedReminderTests(TestCase):
+    """Imams booked several times get one combined reminder"""
+
+    def setUp(self):
+        patcher = mock.patch('dashboard.views.whatsapp_ready', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.busy = Imam.objects.create(name='Busy', phone='500000001')
+        other = Imam.objects.create(name='Other', phone='500000002')
+        for index in range(3):
+            mosque = Mosque.objects.create(name=f'Mosque {index}', address='Address')
+            Schedule.objects.create(mosque=mosque, imam=self.busy, weekday=index % 2, prayer_time='asr')
+        Schedule.objects.create(mosque=mosque, imam=other, weekday=3, prayer_time='fajr')
+
+    def test_weekly_reminders_one_message_per_imam(self):
+        self.client.post(reverse('send_weekly_reminders'))
+
+        combined = OutboxMessage.objects.get(phone_number=self.busy.get_full_phone())
+        self.assertEqual(combined.deliveries.count(), 3)
+        for name in ['Mosque 0', 'Mosque 1', 'Mosque 2', 'السبت', 'الأحد']:
+            self.assertIn(name, combined.message)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    @override_settings(COALESCE_REMINDERS=False)
+    def test_coalescing_can_be_disabled(self):
+        self.client.post(reverse('send_weekly_reminders'))
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+
+class SendDailyRemindersFilterTests(TestCase):
+    """Shards partition the day's schedules; --test --output writes JSON lines"""
+
+    def setUp(self):
+        self.weekday = model_weekday(datetime.date.today())
+        for index in range(6):
+            mosque = Mosque.objects.create(name=f'Mosque {index}', address='Address')
+            imam = Imam.objects.create(name=f'Imam {index}', phone=f'5000000{index}')
+            prayer_time = 'fajr' if index % 2 else 'isha'
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=self.weekday, prayer_time=prayer_time)
+
+    def dry_run(self, *args):
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl', encoding='utf-8') as output:
+            call_command('send_daily_reminders', '--test', '--output', output.name, *args, stdout=io.StringIO())
+            return [json.loads(line) for line in output]
+
+    def test_shards_partition_schedules(self):
+        shards = [self.dry_run('--shard', f'{index}/3') for index in range(3)]
+        schedule_ids = sorted(line['schedules'][0] for shard in shards for line in shard)
+        self.assertEqual(schedule_ids, sorted(Schedule.objects.values_list('id', flat=True)))
+
+    def test_prayer_filter(self):
+        lines = self.dry_run('--prayer', 'fajr')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all('الفجر' in line['message'] for line in lines))
+
+
+@override_settings(WHATSAPP_RATE_LIMIT=0)
+class SendDailyRemindersConcurrencyTests(TestCase):
+    """--concurrency sends chunks in parallel; the Pacer spaces send slots 1/rate apart"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(whatsapp_web_service._breakers, clear=True),
+                        mock.patch.object(WhatsAppWebService, 'is_ready', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        weekday = model_weekday(datetime.date.today())
+        for index in range(6):
+            mosque = Mosque.objects.create(name=f'Mosque {index}', address='Address')
+            imam = Imam.objects.create(name=f'Imam {index}', phone=f'5000000{index}')
+            Schedule.objects.create(mosque=mosque, imam=imam, weekday=weekday, prayer_time='fajr')
+
+    def test_chunks_are_sent_in_parallel(self):
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+
+        def send_batch(service, messages):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return [SendResult(True, 'ok', 'sent') for _ in messages]
+
+        with mock.patch.object(WhatsAppWebService, 'send_batch', autospec=True, side_effect=send_batch) as send:
+            call_command('send_daily_reminders', concurrency=3, batch_size=1, rate=0, stdout=io.StringIO())
+
+        self.assertEqual(send.call_count, 6)
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 3)
+        self.assertEqual(Delivery.objects.filter(status=Delivery.STATUS_SENT).count(), 6)
+
+    def test_pacer_spaces_slots(self):
+        with mock.patch('dashboard.management.commands.send_daily_reminders.time') as clock:
+            clock.monotonic.return_value = 100.0
+            pacer = Pacer(rate=2)
+            pacer.wait()
+            pacer.wait(3)
+            pacer.wait()
+
+        self.assertEqual([call.args[0] for call in clock.sleep.call_args_list], [0.5, 2.0])
+
+    def test_zero_rate_never_waits(self):
+        with mock.patch('dashboard.management.commands.send_daily_reminders.time') as clock:
+            clock.monotonic.return_value = 100.0
+            pacer = Pacer(rate=0)
+            pacer.wait(10)
+
+        clock.sleep.assert_not_called()
+
+
+class TokenBucketTests(TestCase):
+    """The rate limiter's state is shared through its file, so separate instances share one bucket"""
+
+    def test_instances_share_the_bucket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'bucket'
+            first = TokenBucket(path, rate=10, burst=2)
+            second = TokenBucket(path, rate=10, burst=2)
+
+            self.assertEqual(first.reserve(), 0)
+            self.assertEqual(second.reserve(), 0)
+            # The burst is spent: the next slot is 1/rate away for either instance
+            self.assertAlmostEqual(first.reserve(), 0.1, delta=0.02)
+            self.assertAlmostEqual(second.estimate(3), 0.4, delta=0.02)
+
+    def test_zero_rate_disables_limiting(self):
+        bucket = TokenBucket('/nonexistent/bucket', rate=0, burst=1)
+        self.assertEqual([bucket.reserve(100), bucket.estimate(100)], [0, 0])
+
+
+@override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1'], WHATSAPP_READY_TTL=10, WHATSAPP_POOL_SIZE=4)
+class WhatsAppSessionTests(TestCase):
+    """One pooled session per process; /status answers are cached for WHATSAPP_READY_TTL"""
+
+    def setUp(self):
+        for patcher in (mock.patch.object(whatsapp_web_service, '_session', None),
+                        mock.patch.dict(whatsapp_web_service._readiness, clear=True),
+                        mock.patch.dict(whatsapp_web_service._breakers, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_services_share_the_pooled_session(self):
+        first, second = WhatsAppWebService(), WhatsAppWebService()
+        self.assertIs(first.session, second.session)
+        adapter = first.session.get_adapter('http://wa-1')
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_readiness_is_cached_until_the_ttl(self):
+        whatsapp = WhatsAppWebService()
+        whatsapp.session = mock.Mock()
+        whatsapp.session.get.return_value = mock.Mock(status_code=200, json=mock.Mock(return_value={'ready': True}))
+
+        with mock.patch.object(whatsapp_web_service, 'time') as clock:
+            clock.monotonic.return_value = 1000.0
+            self.assertTrue(whatsapp.is_ready())
+            clock.monotonic.return_value += 9
+            self.assertTrue(whatsapp.is_ready())
+            self.assertEqual(whatsapp.session.get.call_count, 1)
+
+            clock.monotonic.return_value += 1
+            self.assertTrue(whatsapp.is_ready())
+            self.assertEqual(whatsapp.session.get.call_count, 2)
+
+            whatsapp.invalidate_readiness()
+            whatsapp.is_ready()
+            self.assertEqual(whatsapp.session.get.call_count, 3)
+
+
+class CircuitBreakerTests(TestCase):
+    """closed -> open after repeated failures -> half_open after the reset timeout -> closed or open"""
+
+    def setUp(self):
+        patcher = mock.patch.object(whatsapp_web_service, 'time')
+        self.clock = patcher.start().monotonic
+        self.addCleanup(patcher.stop)
+        self.clock.return_value = 1000.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        self.transitions = []
+        self.breaker.add_listener(lambda old, new: self.transitions.append((old, new)))
+
+    def trip(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.return_value += 10
+        self.assertEqual(self.breaker.retry_after(), 20)
+        self.assertEqual(self.transitions, [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN)])
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_single_trial_while_half_open(self):
+        self.trip()
+        self.clock.return_value += 29.9
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.return_value += 0.1
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.transitions, [
+            (CircuitBreaker.CLOSED, CircuitBreaker.OPEN),
+            (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN),
+            (CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED),
+        ])
+
+    def test_failed_trial_reopens(self):
+        self.trip()
+        self.clock.return_value += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.retry_after(), 30)
+        self.clock.return_value += 30
+        self.assertTrue(self.breaker.allow_request())
+
+
+@override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1'], WHATSAPP_HEALTH_INTERVAL=0, WHATSAPP_RATE_LIMIT=0,
+                   WHATSAPP_BREAKER_THRESHOLD=2, WHATSAPP_BREAKER_RESET=30)
+class WhatsAppSendBatchTests(TestCase):
+    """/send-batch results, its 404 fallback and the circuit breaker"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(whatsapp_web_service._breakers, clear=True),
+                        mock.patch.object(WhatsAppWebService, 'is_ready', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.whatsapp = WhatsAppWebService()
+        self.whatsapp.session = mock.Mock()
+        self.whatsapp.session.post.side_effect = self.post
+        self.breaker = self.whatsapp.breakers['http://wa-1']
+        self.batch_response = (200, {})
+        self.messages = [(f'96650000000{i}', 'hi') for i in range(4)]
+
+    def post(self, url, json, timeout):
+        status_code, payload = self.batch_response if url.endswith('/send-batch') else (200, {'message': 'ok'})
+        return mock.Mock(status_code=status_code, json=mock.Mock(return_value=payload))
+
+    def test_results_follow_the_items(self):
+        self.batch_response = (200, {'results': [
+            {'success': True}, {'success': False, 'status': 400, 'error': 'not on WhatsApp'}, {'success': False, 'error': 'boom'},
+        ]})
+        results = self.whatsapp.send_batch(self.messages)
+        self.assertEqual([result.outcome for result in results], ['sent', 'not_registered', 'error', 'error'])
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_failed_batch_counts_once(self):
+        self.batch_response = (200, {'results': [{'success': False, 'error': 'boom'}] * 4})
+        results = self.whatsapp.send_batch(self.messages)
+        self.assertEqual({result.outcome for result in results}, {'error'})
+        self.assertEqual((self.breaker.failures, self.breaker.state), (1, CircuitBreaker.CLOSED))
+
+    def test_rejected_batch_releases_half_open_trial(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.opened_at -= 31
+        self.batch_response = (413, {'error': 'Payload too large'})
+
+        results = self.whatsapp.send_batch(self.messages)
+
+        self.assertEqual({result.outcome for result in results}, {'error'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_other_request_errors_become_results(self):
+        self.whatsapp.session.post.side_effect = requests.exceptions.ChunkedEncodingError('truncated')
+
+        results = self.whatsapp.send_batch(self.messages)
+
+        self.assertEqual({result.outcome for result in results}, {'error'})
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_missing_batch_endpoint_falls_back_in_half_open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.opened_at -= 31
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.batch_response = (404, {})
+
+        results = self.whatsapp.send_batch(self.messages)
+
+        self.assertEqual({result.outcome for result in results}, {'sent'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        urls = [call.args[0] for call in self.whatsapp.session.post.call_args_list]
+        self.assertEqual(urls, ['http://wa-1/send-batch'] + ['http://wa-1/send'] * 4)
+
+
+@override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1', 'http://wa-2', 'http://wa-3'],
+                   WHATSAPP_HEALTH_INTERVAL=0, WHATSAPP_RATE_LIMIT=0)
+class WhatsAppEndpointPoolTests(TestCase):
+    """Several Node services: sticky routing per recipient and failover"""
+
+    def setUp(self):
+        # Readiness is cached per process; start every test from a clean slate
+        patcher = mock.patch.dict(whatsapp_web_service._readiness, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.messages = [(f'9665000000{i:02d}', 'hi') for i in range(60)]
+        self.sent_by = {}
+        self.down = set()
+
+    def send_chunk(self, service, url, chunk):
+        if url in self.down:
+            return [SendResult(False, 'down', 'connection_error') for _ in chunk]
+        for phone_number, _ in chunk:
+            self.sent_by[phone_number] = url
+        return [SendResult(True, 'ok', 'sent') for _ in chunk]
+
+    def send_batch(self):
+        with mock.patch.object(WhatsAppWebService, '_send_chunk', autospec=True, side_effect=self.send_chunk):
+            return WhatsAppWebService().send_batch(self.messages)
+
+    def test_recipients_keep_their_endpoint(self):
+        self.send_batch()
+        urls = ['http://wa-1', 'http://wa-2', 'http://wa-3']
+        self.assertEqual(set(self.sent_by.values()), set(urls))
+        for phone_number, url in self.sent_by.items():
+            self.assertEqual(url, rank_endpoints(urls, phone_number)[0])
+            # The home endpoint does not depend on the configured order
+            self.assertEqual(url, rank_endpoints(urls[::-1], phone_number)[0])
+
+    def test_down_endpoint_fails_over(self):
+        self.send_batch()
+        homes = dict(self.sent_by)
+
+        self.down = {'http://wa-1'}
+        self.sent_by = {}
+        results = self.send_batch()
+
+        self.assertTrue(all(result.success for result in results))
+        self.assertNotIn('http://wa-1', self.sent_by.values())
+        # Only the recipients of the failed endpoint moved
+        moved = {phone for phone, url in homes.items() if url != self.sent_by[phone]}
+        self.assertEqual(moved, {phone for phone, url in homes.items() if url == 'http://wa-1'})
+
+    def test_nothing_sent_when_every_endpoint_is_down(self):
+        self.down = {'http://wa-1', 'http://wa-2', 'http://wa-3'}
+        results = self.send_batch()
+        self.assertEqual({result.outcome for result in results}, {'connection_error'})
+        self.assertEqual(self.sent_by, {})
+
+
+@override_settings(WHATSAPP_SERVICE_URLS=['http://wa-1', 'http://wa-2'], WHATSAPP_HEALTH_INTERVAL=0)
+class WhatsAppStatusTests(TestCase):
+    """Pages read the polled status snapshot instead of calling the services"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(whatsapp_web_service._readiness, clear=True),
+                        mock.patch.object(whatsapp_web_service, 'get_session')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.session = whatsapp_web_service.get_session.return_value
+        self.session.get.side_effect = self.get
+        self.down = set()
+        cache.delete(whatsapp_web_service.STATUS_CACHE_KEY)
+        self.addCleanup(cache.delete, whatsapp_web_service.STATUS_CACHE_KEY)
+
+    def get(self, url, timeout):
+        base_url, path = url.rsplit('/', 1)
+        if base_url in self.down:
+            raise requests.exceptions.ConnectionError('refused')
+        if path == 'status':
+            return mock.Mock(status_code=200, json=mock.Mock(return_value={'ready': base_url == 'http://wa-1'}))
+        return mock.Mock(status_code=200, json=mock.Mock(return_value={'authenticated': False, 'qr': 'data:image/png;base64,QR'}))
+
+    def test_refresh_keeps_last_error(self):
+        self.down = {'http://wa-2'}
+        snapshot = whatsapp_web_service.refresh_status(['http://wa-1', 'http://wa-2'])
+        self.assertTrue(snapshot['http://wa-1']['ready'])
+        self.assertEqual(snapshot['http://wa-2']['error'], whatsapp_web_service.CONNECTION_ERROR_MESSAGE)
+        self.assertEqual(whatsapp_web_service._readiness['http://wa-2'][0], False)
+
+        self.down = set()
+        snapshot = whatsapp_web_service.refresh_status(['http://wa-1', 'http://wa-2'])
+        self.assertEqual(snapshot['http://wa-2']['qr'], 'data:image/png;base64,QR')
+        self.assertEqual(snapshot['http://wa-2']['error'], whatsapp_web_service.CONNECTION_ERROR_MESSAGE)
+        self.assertEqual(cache.get(whatsapp_web_service.STATUS_CACHE_KEY), snapshot)
+
+    def test_pages_do_not_call_the_services(self):
+        whatsapp_web_service.refresh_status(['http://wa-1', 'http://wa-2'])
+        self.session.get.reset_mock()
+
+        response = self.client.get(reverse('whatsapp_qr'))
+        self.assertEqual([session['ready'] for session in response.context['sessions']], [True, False])
+        self.assertContains(response, 'data:image/png;base64,QR')
+        self.assertFalse(response.context['is_ready'])
+
+        status = self.client.get(reverse('whatsapp_status')).json()
+        self.assertEqual([session['url'] for session in status['sessions']], ['http://wa-1', 'http://wa-2'])
+        self.assertTrue(whatsapp_web_service.whatsapp_ready())
+        self.session.get.assert_not_called()
@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Timings of the request being handled in this thread/task, set by
+# dashboard.middleware.RequestTimingMiddleware (None outside a request)
+_current = ContextVar('dashboard_request_timings', default=None)
+
+
+class RequestTimings:
+    """Durations collected while handling one request (milliseconds)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self.queries = []
+        self.template_depth = 0
+
+    def add(self, name, duration_ms):
+        self.durations[name] = self.durations.get(name, 0) + duration_ms
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def start():
+    """Begin collecting timings for the current request"""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record(name, duration_ms):
+    """Add a duration to the current request, if there is one"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, duration_ms)
+
+
+@contextmanager
+def track(name):
+    """Time the enclosed block and record it under `name` for the current request"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start_time) * 1000)
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('outbox/requeue/', views.outbox_requeue, name='outbox_requeue'),
     
     # Mosque URLs
     path('mosques/', views.mosque_list, name='mosque_list'),
@@ -16,6 +17,7 @@ urlpatterns = [
     # Imam URLs
     path('imams/', views.imam_list, name='imam_list'),
     path('imams/create/', views.imam_create, name='imam_create'),
+    path('contacts/export/', views.contact_export, name='contact_export'),
     path('imams/<int:pk>/edit/', views.imam_update, name='imam_update'),
     path('imams/<int:pk>/delete/', views.imam_delete, name='imam_delete'),
     
@@ -24,10 +26,21 @@ urlpatterns = [
     path('schedules/send-weekly-reminders/', views.send_weekly_reminders, name='send_weekly_reminders'),
     path('schedules/today/', views.today_schedule, name='today_schedule'),
     path('schedules/today/send-reminders/', views.send_today_reminders, name='send_today_reminders'),
+    path('schedules/export/', views.schedule_export, name='schedule_export'),
     path('schedules/create/', views.schedule_create, name='schedule_create'),
     path('schedules/<int:pk>/edit/', views.schedule_update, name='schedule_update'),
     path('schedules/<int:pk>/delete/', views.schedule_delete, name='schedule_delete'),
     
+    # Bulk import
+    path('import/', views.import_data, name='import_data'),
+    
+    # Live progress of a broadcast (Server-Sent Events)
+    path('broadcasts/<int:pk>/events/', views.broadcast_events, name='broadcast_events'),
+    
     # WhatsApp URLs
     path('whatsapp/qr/', views.whatsapp_qr, name='whatsapp_qr'),
+    path('whatsapp/status/', views.whatsapp_status, name='whatsapp_status'),
+    
+    # Monitoring
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,59 +1,66 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
-from .models import Mosque, Imam, Schedule
-from .forms import MosqueForm, ImamForm, ScheduleForm
-from .whatsapp_web_service import WhatsAppWebService
+from .models import Mosque, Imam, Schedule, BroadcastJob
+from .forms import MosqueForm, ImamForm, ScheduleForm, ImportForm
+from .whatsapp_web_service import status_snapshot, whatsapp_ready
+from .outbox import enqueue_messages, queue_stats, dead_letters, requeue_dead
+from .deliveries import claim
+from .broadcasts import live_events, snapshot_events
+from .reminders import coalesce_enabled, group_by_imam, imam_reminder, combined_imam_reminder
+from .hijri import model_weekday, week_dates
+from .stats import home_stats
+from .pagination import keyset_page
+from .export import export_response, schedule_rows, contact_rows, SCHEDULE_HEADER, CONTACT_HEADER
+from .importer import import_csv, IMPORT_COLUMNS
 
 
 def dashboard(request):
-    mosques = Mosque.objects.all()
-    imams = Imam.objects.all()
-    schedules = Schedule.objects.select_related('mosque', 'imam').all()
+    # Counts and per-day totals are cached until a Mosque, Imam or Schedule changes
+    context = dict(home_stats())
+    context['outbox'] = queue_stats()
+    context['dead_letters'] = dead_letters()
+    return render(request, 'dashboard/dashboard.html', context)
+
+
+def outbox_requeue(request):
+    """Queue one dead letter (message_id) or all of them again"""
+    if request.method != 'POST':
+        return redirect('dashboard')
     
-    # Group schedules by weekday
-    schedule_by_day = {}
-    for schedule in schedules:
-        if schedule.weekday not in schedule_by_day:
-            schedule_by_day[schedule.weekday] = []
-        schedule_by_day[schedule.weekday].append(schedule)
+    message_id = request.POST.get('message_id')
+    ids = [int(message_id)] if message_id and message_id.isdigit() else None
+    requeued_count = requeue_dead(ids)
     
-    context = {
-        'mosques': mosques,
-        'imams': imams,
-        'schedules': schedules,
-        'schedule_by_day': schedule_by_day,
-        'mosque_count': mosques.count(),
-        'imam_count': imams.count(),
-        'schedule_count': schedules.count(),
-    }
-    return render(request, 'dashboard/dashboard.html', context)
+    if requeued_count > 0:
+        messages.success(request, f'تمت إعادة {requeued_count} رسالة إلى قائمة الإرسال.')
+    return redirect('dashboard')
 
 
 # Mosque Views
 def mosque_list(request):
-    mosques = Mosque.objects.all().order_by('name')
-    return render(request, 'dashboard/mosque_list.html', {'mosques': mosques})
+    page = keyset_page(Mosque.objects.all(), ('name', 'id'), request.GET.get('after'))
+    return render(request, 'dashboard/mosque_list.html', {'mosques': page.items, 'page': page})
 
 
 def mosque_schedules(request):
     """Show mosques with schedules for selected day with tabs"""
     import datetime
-    from hijri_converter import Gregorian
     
     # Get the target weekday (0=Saturday, 1=Sunday, etc.)
     # Default to current day
-    today = datetime.datetime.now()
-    weekday_map = {
-        5: 0, 6: 1, 0: 2, 1: 3, 2: 4, 3: 5, 4: 6,
-    }
-    current_weekday = weekday_map[today.weekday()]
+    current_weekday = model_weekday(datetime.date.today())
     
-    target_weekday = int(request.GET.get('weekday', current_weekday))
+    # Out-of-range values wrap around the week (0=Saturday ... 6=Friday)
+    target_weekday = int(request.GET.get('weekday', current_weekday)) % 7
     
-    # Calculate the target date based on weekday
-    days_diff = (target_weekday - current_weekday) % 7
-    target_date = today + datetime.timedelta(days=days_diff)
+    # Date and Hijri date of the next occurrence of the target weekday
+    target_date, hijri_str = week_dates()[target_weekday]
     
     # Get only mosques that have schedules for the target day
     mosques_with_schedules = Mosque.objects.filter(
@@ -63,17 +70,12 @@ def mosque_schedules(request):
     # Get weekday display name
     weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(target_weekday)
     
-    # Convert to Hijri
-    hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-    hijri_months = ['', 'محرم', 'صفر', 'ربيع الأول', 'ربيع الثاني', 'جمادى الأولى', 'جمادى الآخرة', 
-                    'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة']
-    hijri_str = f"{hijri_date.day} {hijri_months[hijri_date.month]} {hijri_date.year}"
-    
     return render(request, 'dashboard/mosque_schedules.html', {
         'mosques': mosques_with_schedules,
         'weekday_display': weekday_display,
         'hijri_date': hijri_str,
         'target_weekday': target_weekday,
+        'job': _broadcast_job(request),
     })
 
 
@@ -113,65 +115,62 @@ def mosque_delete(request, pk):
 
 def send_mosque_notification(request):
     """Send WhatsApp notification to all mosques with schedules for the selected day"""
-    import datetime
-    from .whatsapp_web_service import WhatsAppWebService
-    from hijri_converter import Gregorian
-    
     if request.method != 'POST':
         return redirect('mosque_schedules')
     
-    # Get the target weekday from POST data
-    target_weekday = int(request.POST.get('target_weekday', 0))
-    
-    # Calculate the target date based on weekday
-    today = datetime.datetime.now()
-    weekday_map = {
-        5: 0, 6: 1, 0: 2, 1: 3, 2: 4, 3: 5, 4: 6,
-    }
-    current_weekday = weekday_map[today.weekday()]
-    days_diff = (target_weekday - current_weekday) % 7
-    target_date = today + datetime.timedelta(days=days_diff)
-    
-    # Get mosques that have schedules for the target day
-    mosques_with_schedules = Mosque.objects.filter(
-        schedule__weekday=target_weekday
-    ).distinct()
+    # Get the target weekday from POST data (wrapped into 0-6)
+    target_weekday = int(request.POST.get('target_weekday', 0)) % 7
     
-    if not mosques_with_schedules.exists():
-        messages.warning(request, 'لا توجد مساجد لديها جداول في هذا اليوم')
+    if not whatsapp_ready():
+        messages.error(request, 'خدمة واتساب غير جاهزة. يرجى التأكد من تشغيلها والمصادقة عليها.')
         return redirect(f'/mosques/schedules/?weekday={target_weekday}')
     
-    # Initialize WhatsApp service
-    whatsapp = WhatsAppWebService()
-    
-    if not whatsapp.is_ready():
-        messages.error(request, 'خدمة واتساب غير جاهزة. يرجى التأكد من تشغيلها والمصادقة عليها.')
+    # Date and Hijri date of the next occurrence of the target weekday
+    target_date, hijri_date_str = week_dates()[target_weekday]
+    
+    # Get mosques that have schedules for the target day, with those schedules
+    # and their imams fetched in one extra query instead of one per mosque
+    mosques_with_schedules = list(
+        Mosque.objects.filter(schedule__weekday=target_weekday).distinct().prefetch_related(
+            Prefetch(
+                'schedule_set',
+                queryset=Schedule.objects.filter(weekday=target_weekday).select_related('imam').order_by('id'),
+                to_attr='day_schedules',
+            )
+        )
+    )
+    
+    if not mosques_with_schedules:
+        messages.warning(request, 'لا توجد مساجد لديها جداول في هذا اليوم')
         return redirect(f'/mosques/schedules/?weekday={target_weekday}')
     
-    # Convert to Hijri date
-    hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-    hijri_months = [
-        'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-        'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-    ]
-    hijri_month_name = hijri_months[hijri_date.month - 1]
-    hijri_date_str = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
     weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(target_weekday)
     
-    # Send notifications to each mosque
-    sent_count = 0
-    failed_count = 0
+    # Claim the day's schedules in the delivery ledger; mosques already
+    # notified about all of them (by an earlier click or another user) are skipped
+    claimed = claim('mosque', [
+        (schedule.id, target_date)
+        for mosque in mosques_with_schedules if mosque.get_full_phone()
+        for schedule in mosque.day_schedules
+    ])
+    
+    # Queue notifications for each mosque
+    outbox_items = []
+    outbox_deliveries = []
+    skipped_count = 0
+    delivered_count = 0
     
     for mosque in mosques_with_schedules:
         if not mosque.get_full_phone():
-            failed_count += 1
+            skipped_count += 1
             continue
         
-        # Get schedules for this mosque
-        schedules = Schedule.objects.filter(
-            mosque=mosque,
-            weekday=target_weekday
-        ).select_related('imam')
+        # Schedules for this mosque (prefetched)
+        schedules = mosque.day_schedules
+        delivery_ids = [claimed[(s.id, target_date)] for s in schedules if (s.id, target_date) in claimed]
+        if not delivery_ids:
+            delivered_count += 1
+            continue
         
         # Create message
         message = f"""السلام عليكم ورحمة الله وبركاته
@@ -197,28 +196,28 @@ def send_mosque_notification(request):
         
         message += "\nجزاكم الله خيراً"
         
-        # Send message
-        phone_number = mosque.get_full_phone()
-        success, response_message = whatsapp.send_message(phone_number, message)
-        
-        if success:
-            sent_count += 1
-        else:
-            failed_count += 1
+        outbox_items.append((mosque.name, mosque.get_full_phone(), message))
+        outbox_deliveries.append(delivery_ids)
+    
+    # The page follows the job's progress (see broadcast_events)
+    job = BroadcastJob(kind='mosque', label=f'{weekday_display} {hijri_date_str}')
+    queued_count = enqueue_messages('mosque', outbox_items, outbox_deliveries, job)
     
     # Show results
-    if sent_count > 0:
-        messages.success(request, _(f'تم إرسال {sent_count} إشعار بنجاح!'))
-    if failed_count > 0:
-        messages.warning(request, _(f'فشل إرسال {failed_count} إشعار.'))
+    if queued_count > 0:
+        messages.success(request, f'تمت إضافة {queued_count} إشعار إلى قائمة الإرسال وسيتم إرسالها تباعاً.')
+    if skipped_count > 0:
+        messages.warning(request, f'تم تخطي {skipped_count} مسجد بدون رقم هاتف.')
+    if delivered_count > 0:
+        messages.warning(request, f'تم تخطي {delivered_count} مسجد سبق إرسال الإشعار إليه.')
     
-    return redirect(f'/mosques/schedules/?weekday={target_weekday}')
+    return redirect(_with_job(f'/mosques/schedules/?weekday={target_weekday}', job))
 
 
 # Imam Views
 def imam_list(request):
-    imams = Imam.objects.all()
-    return render(request, 'dashboard/imam_list.html', {'imams': imams})
+    page = keyset_page(Imam.objects.all(), ('name', 'id'), request.GET.get('after'))
+    return render(request, 'dashboard/imam_list.html', {'imams': page.items, 'page': page})
 
 
 def imam_create(request):
@@ -258,44 +257,43 @@ def imam_delete(request, pk):
 # Schedule Views
 def schedule_list(request):
     import datetime
-    from hijri_converter import Gregorian
     
     # Get dates for each weekday
-    today = datetime.date.today()
-    current_weekday = (today.weekday() + 2) % 7  # Convert to our model (0=Saturday)
-    
-    weekday_dates = {}
-    weekday_date_objects = {}
-    hijri_months = [
-        'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-        'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-    ]
-    
-    for weekday in range(7):
-        days_diff = (weekday - current_weekday) % 7
-        target_date = today + datetime.timedelta(days=days_diff)
-        weekday_date_objects[weekday] = target_date
-        hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-        hijri_month_name = hijri_months[hijri_date.month - 1]
-        weekday_dates[weekday] = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
-    
-    # Get all schedules and sort by actual date
-    schedules = list(Schedule.objects.select_related('mosque', 'imam').all())
-    schedules.sort(key=lambda s: weekday_date_objects[s.weekday])
-    
-    schedule_by_day = {}
-    for schedule in schedules:
-        if schedule.weekday not in schedule_by_day:
-            schedule_by_day[schedule.weekday] = []
-        schedule_by_day[schedule.weekday].append(schedule)
+    week = week_dates()
+    weekday_dates = {weekday: hijri_str for weekday, (_, hijri_str) in week.items()}
+    
+    # Order by upcoming date: today's weekday through Friday, then Saturday
+    # up to yesterday. Each part is an index range scan on (weekday, id).
+    today_weekday = model_weekday(datetime.date.today())
+    schedules = Schedule.objects.select_related('mosque', 'imam')
+    page = keyset_page(
+        [schedules.filter(weekday__gte=today_weekday), schedules.filter(weekday__lt=today_weekday)],
+        ('weekday', 'id'),
+        request.GET.get('after'),
+    )
     
     return render(request, 'dashboard/schedule_list.html', {
-        'schedules': schedules,
-        'schedule_by_day': schedule_by_day,
+        'schedules': page.items,
+        'page': page,
         'weekday_dates': weekday_dates,
+        'job': _broadcast_job(request),
     })
 
 
+def schedule_export(request):
+    """Download the weekly schedule with mosque and caller phone numbers (?format=csv|xlsx)"""
+    return export_response(
+        request.GET.get('format', 'csv'), 'schedules', SCHEDULE_HEADER, schedule_rows(), 'الجدول الأسبوعي'
+    )
+
+
+def contact_export(request):
+    """Download the phone numbers of all mosques and callers (?format=csv|xlsx)"""
+    return export_response(
+        request.GET.get('format', 'csv'), 'contacts', CONTACT_HEADER, contact_rows(), 'جهات الاتصال'
+    )
+
+
 def schedule_create(request):
     if request.method == 'POST':
         form = ScheduleForm(request.POST)
@@ -333,27 +331,16 @@ def schedule_delete(request, pk):
 # Today's Schedule View
 def today_schedule(request):
     import datetime
-    from hijri_converter import Gregorian
     
     # Get the target weekday (0=Saturday, 1=Sunday, etc.)
     # Default to current day
-    today = datetime.datetime.now()
-    weekday_map = {
-        5: 0,  # Python Saturday → Our 0
-        6: 1,  # Python Sunday → Our 1
-        0: 2,  # Python Monday → Our 2
-        1: 3,  # Python Tuesday → Our 3
-        2: 4,  # Python Wednesday → Our 4
-        3: 5,  # Python Thursday → Our 5
-        4: 6,  # Python Friday → Our 6
-    }
-    current_weekday = weekday_map[today.weekday()]
+    current_weekday = model_weekday(datetime.date.today())
     
-    target_weekday = int(request.GET.get('weekday', current_weekday))
+    # Out-of-range values wrap around the week (0=Saturday ... 6=Friday)
+    target_weekday = int(request.GET.get('weekday', current_weekday)) % 7
     
-    # Calculate the target date based on weekday
-    days_diff = (target_weekday - current_weekday) % 7
-    target_date = today + datetime.timedelta(days=days_diff)
+    # Date and Hijri date of the next occurrence of the target weekday
+    target_date, hijri_str = week_dates()[target_weekday]
     
     # Get all schedules for the target day
     schedules = Schedule.objects.filter(weekday=target_weekday).select_related('mosque', 'imam').order_by('prayer_time')
@@ -361,253 +348,187 @@ def today_schedule(request):
     # Get day name
     weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(target_weekday)
     
-    # Convert to Hijri
-    hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-    hijri_months = ['', 'محرم', 'صفر', 'ربيع الأول', 'ربيع الثاني', 'جمادى الأولى', 'جمادى الآخرة', 
-                    'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة']
-    hijri_str = f"{hijri_date.day} {hijri_months[hijri_date.month]} {hijri_date.year}"
-    
     context = {
         'schedules': schedules,
         'target_weekday': target_weekday,
         'weekday_display': weekday_display,
         'target_date': target_date.strftime('%Y-%m-%d'),
         'hijri_date': hijri_str,
+        'job': _broadcast_job(request),
     }
     return render(request, 'dashboard/today_schedule.html', context)
 
 
 # Send reminders for today's schedules
 def send_today_reminders(request):
-    import datetime
-    from .whatsapp_web_service import WhatsAppWebService
-    from hijri_converter import Gregorian
-    
     if request.method != 'POST':
         return redirect('today_schedule')
     
-    # Get the target weekday from POST data
-    target_weekday = int(request.POST.get('target_weekday', 0))
+    # Get the target weekday from POST data (wrapped into 0-6)
+    target_weekday = int(request.POST.get('target_weekday', 0)) % 7
     
-    # Calculate the target date based on weekday
-    today = datetime.datetime.now()
-    weekday_map = {
-        5: 0, 6: 1, 0: 2, 1: 3, 2: 4, 3: 5, 4: 6,
-    }
-    current_weekday = weekday_map[today.weekday()]
-    days_diff = (target_weekday - current_weekday) % 7
-    target_date = today + datetime.timedelta(days=days_diff)
+    if not whatsapp_ready():
+        messages.error(request, _('WhatsApp service is not ready. Please make sure it is running and authenticated.'))
+        return redirect(f'/schedules/today/?weekday={target_weekday}')
+    
+    # Date and Hijri date of the next occurrence of the target weekday
+    target_date, hijri_date_str = week_dates()[target_weekday]
     
     # Get all schedules for the target day
-    schedules = Schedule.objects.filter(weekday=target_weekday).select_related('mosque', 'imam')
+    schedules = list(Schedule.objects.filter(weekday=target_weekday).select_related('mosque', 'imam'))
     
-    if not schedules.exists():
+    if not schedules:
         messages.warning(request, _('No schedules found for the selected day.'))
         return redirect(f'/schedules/today/?weekday={target_weekday}')
     
-    # Initialize WhatsApp service
-    whatsapp = WhatsAppWebService()
-    
-    if not whatsapp.is_ready():
-        messages.error(request, _('WhatsApp service is not ready. Please make sure it is running and authenticated.'))
-        return redirect(f'/schedules/today/?weekday={target_weekday}')
+    # Reminders already sent or queued for this date are skipped
+    claimed = claim('today', [(schedule.id, target_date) for schedule in schedules])
     
-    # Send notifications
-    sent_count = 0
-    failed_count = 0
+    # Queue notifications; with COALESCE_REMINDERS an imam booked at several
+    # mosques gets one message listing all of them
+    outbox_items = []
+    outbox_deliveries = []
+    delivered_count = 0
     
-    for schedule in schedules:
-        imam = schedule.imam
-        mosque = schedule.mosque
-        
-        # Get prayer time and weekday in Arabic
-        prayer_time_display = dict(Schedule.PRAYER_TIME_CHOICES).get(schedule.prayer_time)
-        weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(schedule.weekday)
-        
-        # Convert to Hijri date
-        hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-        hijri_months = [
-            'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-            'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-        ]
-        hijri_month_name = hijri_months[hijri_date.month - 1]
-        hijri_date_str = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
-        
-        # Create message
-        message = f"""السلام عليكم ورحمة الله وبركاته
-
-تذكير: لديك موعد إلقاء كلمة يوم {weekday_display}
-🕌 المسجد: {mosque.name}
-📍 الموقع: {mosque.address}
-📅 التاريخ الهجري: {hijri_date_str}
-🕌 الصلاة: {prayer_time_display}"""
-        
-        # Add mosque phone number if available
-        if mosque.phone:
-            message += f"\n📞 هاتف المسجد: {mosque.get_full_phone()}"
-        
-        # Add schedule notes if available
-        if schedule.notes:
-            message += f"\n📝 ملاحظات: {schedule.notes}"
+    for group in group_by_imam(schedules, coalesce_enabled()):
+        owned = [schedule for schedule in group if (schedule.id, target_date) in claimed]
+        delivered_count += len(group) - len(owned)
+        if not owned:
+            continue
         
         # Add sender notes from form if available
-        sender_notes = request.POST.get(f'notes_{schedule.id}', '').strip()
-        if sender_notes:
-            message += f"\n📝 ملاحظة إضافية: {sender_notes}"
+        sender_notes = {schedule.id: request.POST.get(f'notes_{schedule.id}', '').strip() for schedule in owned}
         
-        message += "\n\nعند الانتهاء من إلقاء الكلمة يرجى إرسال رسالة:\n\"تم الانتهاء من إلقاء الكلمة\"\n\nجزاك الله خيراً"
-        
-        phone_number = imam.get_full_phone()
-        
-        # Send message
-        success, response_message = whatsapp.send_message(phone_number, message)
-        
-        if success:
-            sent_count += 1
+        if len(owned) == 1:
+            message = imam_reminder(owned[0], hijri_date_str, sender_notes[owned[0].id])
         else:
-            failed_count += 1
+            message = combined_imam_reminder(owned, {target_weekday: (target_date, hijri_date_str)}, sender_notes)
+        
+        imam = owned[0].imam
+        outbox_items.append((imam.name, imam.get_full_phone(), message))
+        outbox_deliveries.append([claimed[(schedule.id, target_date)] for schedule in owned])
+    
+    # The page follows the job's progress (see broadcast_events)
+    weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(target_weekday)
+    job = BroadcastJob(kind='today', label=f'{weekday_display} {hijri_date_str}')
+    queued_count = enqueue_messages('today', outbox_items, outbox_deliveries, job)
     
     # Show results
-    if sent_count > 0:
-        messages.success(request, _(f'Successfully sent {sent_count} reminder(s)!'))
-    if failed_count > 0:
-        messages.warning(request, _(f'Failed to send {failed_count} reminder(s).'))
+    messages.success(request, _(f'Queued {queued_count} reminder(s) for sending.'))
+    if delivered_count > 0:
+        messages.warning(request, _(f'Skipped {delivered_count} reminder(s) that were already sent.'))
     
-    return redirect(f'/schedules/today/?weekday={target_weekday}')
+    return redirect(_with_job(f'/schedules/today/?weekday={target_weekday}', job))
 
 
 def send_weekly_reminders(request):
     """Send reminders to all imams in the weekly schedule with day and date"""
-    import datetime
-    from hijri_converter import Gregorian
-    
     if request.method != 'POST':
         return redirect('schedule_list')
     
-    # Get all schedules
-    schedules = Schedule.objects.select_related('mosque', 'imam').all()
-    
-    if not schedules.exists():
-        messages.warning(request, _('No schedules found to send reminders.'))
+    if not whatsapp_ready():
+        messages.error(request, _('WhatsApp service is not ready. Please make sure it is running and authenticated.'))
         return redirect('schedule_list')
     
-    # Initialize WhatsApp service
-    whatsapp = WhatsAppWebService()
+    # Get all schedules
+    schedules = list(Schedule.objects.select_related('mosque', 'imam').all())
     
-    if not whatsapp.is_ready():
-        messages.error(request, _('WhatsApp service is not ready. Please make sure it is running and authenticated.'))
+    if not schedules:
+        messages.warning(request, _('No schedules found to send reminders.'))
         return redirect('schedule_list')
     
     # Calculate dates for each weekday
-    today = datetime.datetime.now()
-    current_weekday = (today.weekday() + 2) % 7  # Convert to our model (0=Saturday)
-    
-    hijri_months = [
-        'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-        'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-    ]
-    
-    # Send notifications
-    sent_count = 0
-    failed_count = 0
-    
-    for schedule in schedules:
-        imam = schedule.imam
-        mosque = schedule.mosque
-        
-        # Calculate the target date for this schedule
-        days_diff = (schedule.weekday - current_weekday) % 7
-        target_date = today + datetime.timedelta(days=days_diff)
-        
-        # Get prayer time and weekday in Arabic
-        prayer_time_display = dict(Schedule.PRAYER_TIME_CHOICES).get(schedule.prayer_time)
-        weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(schedule.weekday)
-        
-        # Convert to Hijri date
-        hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-        hijri_month_name = hijri_months[hijri_date.month - 1]
-        hijri_date_str = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
-        
-        # Create message
-        message = f"""السلام عليكم ورحمة الله وبركاته
-
-تذكير: لديك موعد إلقاء كلمة يوم {weekday_display}
-🕌 المسجد: {mosque.name}
-📍 الموقع: {mosque.address}
-📅 التاريخ الهجري: {hijri_date_str}
-🕌 الصلاة: {prayer_time_display}"""
-        
-        # Add mosque phone number if available
-        if mosque.phone:
-            message += f"\n📞 هاتف المسجد: {mosque.get_full_phone()}"
-        
-        # Add schedule notes if available
-        if schedule.notes:
-            message += f"\n📝 ملاحظات: {schedule.notes}"
-        
-        message += "\n\nعند الانتهاء من إلقاء الكلمة يرجى إرسال رسالة:\n\"تم الانتهاء من إلقاء الكلمة\"\n\nجزاك الله خيراً"
-        
-        phone_number = imam.get_full_phone()
-        
-        # Send message
-        success, response_message = whatsapp.send_message(phone_number, message)
+    week = week_dates()
+    
+    # Reminders already sent or queued for this week are skipped
+    claimed = claim('weekly', [(schedule.id, week[schedule.weekday][0]) for schedule in schedules])
+    
+    # Queue notifications; with COALESCE_REMINDERS each imam gets one message
+    # for the whole week, listing the bookings day by day
+    outbox_items = []
+    outbox_deliveries = []
+    delivered_count = 0
+    
+    for group in group_by_imam(schedules, coalesce_enabled()):
+        # Date of each schedule within the coming week
+        owned = [schedule for schedule in group if (schedule.id, week[schedule.weekday][0]) in claimed]
+        delivered_count += len(group) - len(owned)
+        if not owned:
+            continue
         
-        if success:
-            sent_count += 1
+        if len(owned) == 1:
+            message = imam_reminder(owned[0], week[owned[0].weekday][1])
         else:
-            failed_count += 1
+            message = combined_imam_reminder(owned, week)
+        
+        imam = owned[0].imam
+        outbox_items.append((imam.name, imam.get_full_phone(), message))
+        outbox_deliveries.append([claimed[(schedule.id, week[schedule.weekday][0])] for schedule in owned])
+    
+    job = BroadcastJob(kind='weekly')
+    queued_count = enqueue_messages('weekly', outbox_items, outbox_deliveries, job)
     
     # Show results
-    if sent_count > 0:
-        messages.success(request, _(f'Successfully sent {sent_count} reminder(s) to imams!'))
-    if failed_count > 0:
-        messages.warning(request, _(f'Failed to send {failed_count} reminder(s).'))
+    messages.success(request, _(f'Queued {queued_count} reminder(s) to imams for sending.'))
+    if delivered_count > 0:
+        messages.warning(request, _(f'Skipped {delivered_count} reminder(s) that were already sent.'))
     
-    return redirect('schedule_list')
+    return redirect(_with_job(reverse('schedule_list'), job))
 
 
 def send_weekly_mosque_reminders(request):
     """Send weekly reminders to all mosques with their scheduled imams"""
-    import datetime
-    from hijri_converter import Gregorian
-    
     if request.method != 'POST':
         return redirect('mosque_schedules')
     
-    # Get all mosques that have schedules
-    mosques_with_schedules = Mosque.objects.filter(schedule__isnull=False).distinct()
-    
-    if not mosques_with_schedules.exists():
-        messages.warning(request, 'لا توجد مساجد لديها جداول')
+    if not whatsapp_ready():
+        messages.error(request, 'خدمة واتساب غير جاهزة. يرجى التأكد من تشغيلها والمصادقة عليها.')
         return redirect('mosque_schedules')
     
-    # Initialize WhatsApp service
-    whatsapp = WhatsAppWebService()
-    
-    if not whatsapp.is_ready():
-        messages.error(request, 'خدمة واتساب غير جاهزة. يرجى التأكد من تشغيلها والمصادقة عليها.')
+    # Get all mosques that have schedules
+    mosques_with_schedules = list(
+        Mosque.objects.filter(schedule__isnull=False).distinct().prefetch_related(
+            Prefetch(
+                'schedule_set',
+                queryset=Schedule.objects.select_related('imam').order_by('weekday', 'id'),
+                to_attr='week_schedules',
+            )
+        )
+    )
+    
+    if not mosques_with_schedules:
+        messages.warning(request, 'لا توجد مساجد لديها جداول')
         return redirect('mosque_schedules')
     
     # Calculate dates for each weekday
-    today = datetime.datetime.now()
-    current_weekday = (today.weekday() + 2) % 7  # Convert to our model (0=Saturday)
+    week = week_dates()
     
-    hijri_months = [
-        'محرم', 'صفر', 'ربيع الأول', 'ربيع الآخر', 'جمادى الأولى', 'جمادى الآخرة',
-        'رجب', 'شعبان', 'رمضان', 'شوال', 'ذو القعدة', 'ذو الحجة'
-    ]
+    # Mosques already notified about all of their schedules this week are skipped
+    claimed = claim('weekly_mosque', [
+        (schedule.id, week[schedule.weekday][0])
+        for mosque in mosques_with_schedules if mosque.get_full_phone()
+        for schedule in mosque.week_schedules
+    ])
     
-    # Send notifications
-    sent_count = 0
-    failed_count = 0
+    # Queue notifications
+    outbox_items = []
+    outbox_deliveries = []
+    skipped_count = 0
+    delivered_count = 0
     
     for mosque in mosques_with_schedules:
         if not mosque.get_full_phone():
-            failed_count += 1
+            skipped_count += 1
             continue
         
-        # Get all schedules for this mosque
-        schedules = Schedule.objects.filter(mosque=mosque).select_related('imam')
+        # All schedules for this mosque (prefetched)
+        schedules = mosque.week_schedules
+        delivery_ids = [
+            claimed[(s.id, week[s.weekday][0])] for s in schedules if (s.id, week[s.weekday][0]) in claimed
+        ]
+        if not delivery_ids:
+            delivered_count += 1
+            continue
         
         # Create message header
         message = f"""السلام عليكم ورحمة الله وبركاته
@@ -627,14 +548,8 @@ def send_weekly_mosque_reminders(request):
         for weekday in sorted(schedule_by_day.keys()):
             weekday_display = dict(Schedule.WEEKDAY_CHOICES).get(weekday)
             
-            # Calculate the target date for this weekday
-            days_diff = (weekday - current_weekday) % 7
-            target_date = today + datetime.timedelta(days=days_diff)
-            
-            # Convert to Hijri date
-            hijri_date = Gregorian(target_date.year, target_date.month, target_date.day).to_hijri()
-            hijri_month_name = hijri_months[hijri_date.month - 1]
-            hijri_date_str = f"{hijri_date.day} {hijri_month_name} {hijri_date.year} هـ"
+            # Date of this weekday within the coming week
+            target_date, hijri_date_str = week[weekday]
             
             message += f"📅 {weekday_display} - {hijri_date_str}\n"
             
@@ -648,31 +563,114 @@ def send_weekly_mosque_reminders(request):
         
         message += "جزاكم الله خيراً"
         
-        # Send message
-        phone_number = mosque.get_full_phone()
-        success, response_message = whatsapp.send_message(phone_number, message)
-        
-        if success:
-            sent_count += 1
-        else:
-            failed_count += 1
+        outbox_items.append((mosque.name, mosque.get_full_phone(), message))
+        outbox_deliveries.append(delivery_ids)
+    
+    job = BroadcastJob(kind='weekly_mosque')
+    queued_count = enqueue_messages('weekly_mosque', outbox_items, outbox_deliveries, job)
     
     # Show results
-    if sent_count > 0:
-        messages.success(request, f'تم إرسال {sent_count} إشعار أسبوعي بنجاح!')
-    if failed_count > 0:
-        messages.warning(request, f'فشل إرسال {failed_count} إشعار.')
+    if queued_count > 0:
+        messages.success(request, f'تمت إضافة {queued_count} إشعار أسبوعي إلى قائمة الإرسال وسيتم إرسالها تباعاً.')
+    if skipped_count > 0:
+        messages.warning(request, f'تم تخطي {skipped_count} مسجد بدون رقم هاتف.')
+    if delivered_count > 0:
+        messages.warning(request, f'تم تخطي {delivered_count} مسجد سبق إرسال الإشعار إليه.')
+    
+    return redirect(_with_job(reverse('mosque_schedules'), job))
+
+
+def import_data(request):
+    """Bulk import mosques, callers or schedules from an uploaded CSV file"""
+    import io
+    
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            csv_file = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            try:
+                result = import_csv(
+                    form.cleaned_data['kind'],
+                    csv_file,
+                    skip_invalid=form.cleaned_data['skip_invalid'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except UnicodeDecodeError:
+                form.add_error('file', 'الملف ليس بترميز UTF-8.')
+            else:
+                if result.rolled_back:
+                    messages.warning(request, 'لم يتم حفظ أي بيانات.')
+                else:
+                    messages.success(request, f'تم الاستيراد: {result.created} جديد، {result.updated} محدث.')
+    else:
+        form = ImportForm()
+    
+    return render(request, 'dashboard/import.html', {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+        'columns': IMPORT_COLUMNS,
+    })
+
+
+def _with_job(url, job):
+    """Add ?job=<id> to a page URL when the broadcast queued anything"""
+    if job.pk is None:
+        return url
+    return f'{url}{"&" if "?" in url else "?"}job={job.pk}'
+
+
+def _broadcast_job(request):
+    """The broadcast a page was redirected back with, if any"""
+    job_id = request.GET.get('job', '')
+    return BroadcastJob.objects.filter(pk=job_id).first() if job_id.isdigit() else None
+
+
+async def broadcast_events(request, pk):
+    """Server-Sent Events with the per-recipient results and running totals of a broadcast"""
+    if not await BroadcastJob.objects.filter(pk=pk).aexists():
+        raise Http404
+    
+    # Under ASGI the stream stays open without holding a thread; a WSGI
+    # server would buffer an endless stream, so it gets the current state
+    # and the browser's EventSource reconnects for the next one
+    if isinstance(request, ASGIRequest):
+        events = live_events(pk)
+    else:
+        events = snapshot_events(pk)
     
-    return redirect('mosque_schedules')
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through as they come
+    return response
 
 
 def whatsapp_qr(request):
     """Display WhatsApp QR code for authentication"""
-    whatsapp = WhatsAppWebService()
-    qr_data = whatsapp.get_qr_code()
+    # Each endpoint is a separate WhatsApp session with its own QR code;
+    # the background poller keeps them in the cache, so no service is called here
+    sessions = status_snapshot()
     
     context = {
-        'qr_data': qr_data,
-        'is_ready': whatsapp.is_ready()
+        'sessions': sessions,
+        'is_ready': all(session['ready'] for session in sessions),
+        'refresh_seconds': max(2, getattr(settings, 'WHATSAPP_HEALTH_INTERVAL', 5)),
     }
     return render(request, 'dashboard/whatsapp_qr.html', context)
+
+
+def whatsapp_status(request):
+    """Cached state of every WhatsApp session, polled by the QR page"""
+    sessions = status_snapshot()
+    return JsonResponse({
+        'sessions': sessions,
+        'is_ready': all(session['ready'] for session in sessions),
+    })
+
+
+def metrics(request):
+    """Prometheus metrics (request, WhatsApp and reminder latencies, outbox depth)"""
+    from .metrics import render as render_metrics
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
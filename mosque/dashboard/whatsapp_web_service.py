@@ -1,41 +1,568 @@
+import hashlib
+import math
+import os
 import requests
-import json
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from . import metrics, timing
+from .ratelimit import get_limiter
+
+
+# Shared across service instances so views and commands reuse pooled
+# keep-alive connections and the cached readiness state within a process
+_session = None
+_session_lock = threading.Lock()
+_readiness = {}
+_breakers = {}
+_health_thread = None
+
+CIRCUIT_OPEN_MESSAGE = "WhatsApp service is unavailable (circuit open). Message was not attempted."
+NOT_READY_MESSAGE = "WhatsApp service is not ready. Please make sure the service is running and authenticated."
+CONNECTION_ERROR_MESSAGE = "Cannot connect to WhatsApp service. Make sure the Node.js server is running."
+TIMEOUT_MESSAGE = "Request timeout. WhatsApp service took too long to respond."
+
+# Result of one message in send_batch(); outcome is one of
+# 'sent', 'not_registered', 'error', 'timeout', 'connection_error', 'not_ready', 'circuit_open'
+SendResult = namedtuple('SendResult', ['success', 'message', 'outcome'])
+
+# Outcomes where the message certainly did not reach WhatsApp, so another
+# endpoint may send it; after a timeout or 500 it may have, and is not retried here
+FAILOVER_OUTCOMES = {'circuit_open', 'not_ready', 'connection_error'}
+
+# Last polled state of every endpoint, shared by the processes using the cache;
+# the lease lets one of them poll per interval
+STATUS_CACHE_KEY = 'dashboard:whatsapp_status'
+STATUS_LEASE_KEY = 'dashboard:whatsapp_status_lease'
+
+
+class TimedSession(requests.Session):
+    """Session that reports each call's duration to the request timing middleware"""
+
+    def request(self, *args, **kwargs):
+        with timing.track('whatsapp'):
+            return super().request(*args, **kwargs)
+
+
+def get_session():
+    """Return the process-wide pooled HTTP session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = getattr(settings, 'WHATSAPP_POOL_SIZE', 10)
+                session = TimedSession()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+class CircuitBreaker:
+    """
+    Stops calling the WhatsApp service after repeated failures
+
+    closed: requests flow normally
+    open: requests are short-circuited until reset_timeout has passed
+    half_open: a single trial request is let through; its outcome closes or re-opens the circuit
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.listeners = []
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+    
+    def retry_after(self):
+        """Seconds until an open circuit lets a trial request through"""
+        if self._state != self.OPEN:
+            return 0
+        return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+    
+    def add_listener(self, callback):
+        """Register callback(old_state, new_state), called on every transition"""
+        self.listeners.append(callback)
+    
+    def _transition(self, new_state):
+        old_state = self._state
+        self._state = new_state
+        if new_state == self.OPEN:
+            self.opened_at = time.monotonic()
+        if old_state != new_state:
+            for callback in list(self.listeners):
+                callback(old_state, new_state)
+    
+    def allow_request(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_in_flight:
+                self._transition(self.HALF_OPEN)
+                self.trial_in_flight = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.trial_in_flight = False
+            self._transition(self.CLOSED)
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.trial_in_flight = False
+                self._transition(self.OPEN)
+
+
+def get_breaker(base_url):
+    """Return the process-wide circuit breaker for a service URL"""
+    with _session_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(
+                failure_threshold=getattr(settings, 'WHATSAPP_BREAKER_THRESHOLD', 5),
+                reset_timeout=getattr(settings, 'WHATSAPP_BREAKER_RESET', 30),
+            )
+        return _breakers[base_url]
+
+
+def service_urls():
+    """Configured whatsapp-web.js endpoints, one WhatsApp session each"""
+    urls = getattr(settings, 'WHATSAPP_SERVICE_URLS', None) or [
+        getattr(settings, 'WHATSAPP_SERVICE_URL', 'http://localhost:3000')
+    ]
+    return [url.rstrip('/') for url in urls]
+
+
+def rank_endpoints(urls, phone_number):
+    """
+    Order endpoints by preference for one recipient (rendezvous hashing)
+
+    The first endpoint is the recipient's home session, so an imam always
+    hears from the same number while it is healthy. If it goes down only its
+    recipients move, each to their next choice, and they move back once it
+    recovers; recipients of other endpoints never change sessions.
+    """
+    def score(url):
+        return hashlib.blake2b(f'{url}|{phone_number}'.encode(), digest_size=8).digest()
+    return sorted(urls, key=score, reverse=True)
+
+
+def endpoint_limiters(urls):
+    """Rate limiter per endpoint; a single endpoint keeps the bucket of single-session deployments"""
+    return {url: get_limiter(url if len(urls) > 1 else None) for url in urls}
+
+
+def estimated_wait(count, limiters=None):
+    """Seconds before `count` more messages could start, spread over the endpoints (for progress/ETA displays)"""
+    limiters = limiters or endpoint_limiters(service_urls())
+    share = math.ceil(count / len(limiters))
+    return max(limiter.estimate(share) for limiter in limiters.values())
+
+
+def check_status(session, base_url, raise_errors=False):
+    """
+    Ask one endpoint's /status whether its client is ready, and cache the answer
+
+    Args:
+        raise_errors: Re-raise request errors (after caching not ready)
+                      instead of only logging them
+    """
+    try:
+        with metrics.WHATSAPP_READY_CHECK_DURATION.time():
+            response = session.get(f'{base_url}/status', timeout=5)
+        ready = False
+        if response.status_code == 200:
+            data = response.json()
+            ready = data.get('ready', False)
+    except Exception as e:
+        _readiness[base_url] = (False, time.monotonic())
+        if raise_errors:
+            raise
+        print(f"Error checking WhatsApp service status ({base_url}): {e}")
+        ready = False
+
+    _readiness[base_url] = (ready, time.monotonic())
+    return ready
+
+
+def _health_interval():
+    return getattr(settings, 'WHATSAPP_HEALTH_INTERVAL', 5)
+
+
+def poll_endpoint(session, url, previous=None):
+    """
+    Current state of one endpoint: /status, and /qr while it is not linked
+
+    Args:
+        previous: The endpoint's last snapshot entry; its error is kept
+                  until a newer one replaces it
+
+    Returns:
+        dict: {'url', 'ready', 'qr' (data URL or ''), 'message',
+               'error', 'error_at', 'checked_at'}
+    """
+    previous = previous or {}
+    entry = {
+        'url': url,
+        'ready': False,
+        'qr': '',
+        'message': '',
+        'error': previous.get('error', ''),
+        'error_at': previous.get('error_at'),
+        'checked_at': timezone.now(),
+    }
+    try:
+        entry['ready'] = check_status(session, url, raise_errors=True)
+        if not entry['ready']:
+            response = session.get(f'{url}/qr', timeout=5)
+            payload = _json(response)
+            if response.status_code == 200:
+                entry['qr'] = payload.get('qr') or ''
+                entry['message'] = payload.get('message', '')
+            else:
+                entry['message'] = 'Failed to get QR code'
+    except requests.exceptions.ConnectionError:
+        entry['error'], entry['error_at'] = CONNECTION_ERROR_MESSAGE, entry['checked_at']
+    except Exception as e:
+        entry['error'], entry['error_at'] = f'Error: {str(e)}', entry['checked_at']
+    return entry
+
+
+def refresh_status(urls):
+    """
+    Poll every endpoint and store the result as the shared status snapshot
+
+    Returns:
+        dict: {url: snapshot entry}
+    """
+    session = get_session()
+    previous = cache.get(STATUS_CACHE_KEY) or {}
+    if len(urls) > 1:
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            entries = list(executor.map(lambda url: poll_endpoint(session, url, previous.get(url)), urls))
+    else:
+        entries = [poll_endpoint(session, url, previous.get(url)) for url in urls]
+    snapshot = {entry['url']: entry for entry in entries}
+    # Outlives a few missed polls, then the endpoints count as unknown again
+    cache.set(STATUS_CACHE_KEY, snapshot, max(3 * _health_interval(), getattr(settings, 'WHATSAPP_READY_TTL', 10)))
+    return snapshot
+
+
+def _load_readiness(snapshot):
+    """Seed this process's readiness cache from a snapshot another process polled"""
+    now = timezone.now()
+    for url, entry in (snapshot or {}).items():
+        age = (now - entry['checked_at']).total_seconds()
+        _readiness[url] = (entry['ready'], time.monotonic() - age)
+
+
+def start_health_checks(urls):
+    """
+    Poll every endpoint from a daemon thread (once per process)
+
+    Every WHATSAPP_HEALTH_INTERVAL seconds the process holding the lease
+    refreshes the shared snapshot; the others load it into their readiness
+    cache. Routing decisions and pages thus use a fresh readiness flag
+    instead of finding a dead session with a send or a page load.
+    """
+    global _health_thread
+    interval = _health_interval()
+    if interval <= 0:
+        return
+    with _session_lock:
+        # A forked worker inherits the thread object but not the thread
+        if _health_thread is not None and _health_thread.is_alive():
+            return
+
+        def poll():
+            while True:
+                try:
+                    if cache.add(STATUS_LEASE_KEY, os.getpid(), interval * 0.9):
+                        refresh_status(urls)
+                    else:
+                        _load_readiness(cache.get(STATUS_CACHE_KEY))
+                except Exception as e:
+                    # Keep polling; a page load must never be what finds the cache broken
+                    print(f"Error polling WhatsApp service status: {e}")
+                time.sleep(interval)
+
+        _health_thread = threading.Thread(target=poll, name='whatsapp-health', daemon=True)
+        _health_thread.start()
+
+
+def status_snapshot():
+    """
+    Last polled state of every endpoint, without any HTTP call
+
+    Starts the background poller on first use. Endpoints it has not
+    reached yet are reported as not ready. With WHATSAPP_HEALTH_INTERVAL
+    set to 0 there is no poller and a missing snapshot is polled here.
+
+    Returns:
+        list: Snapshot entries (see poll_endpoint), in configured order
+    """
+    urls = service_urls()
+    start_health_checks(urls)
+    snapshot = cache.get(STATUS_CACHE_KEY)
+    if snapshot is None and _health_interval() <= 0:
+        snapshot = refresh_status(urls)
+    snapshot = snapshot or {}
+    return [
+        snapshot.get(url) or {
+            'url': url, 'ready': False, 'qr': '', 'message': '', 'error': '', 'error_at': None, 'checked_at': None,
+        }
+        for url in urls
+    ]
+
+
+def whatsapp_ready():
+    """True when the last poll found at least one endpoint ready"""
+    return any(entry['ready'] for entry in status_snapshot())
+
 
 class WhatsAppWebService:
     """
     Service to send WhatsApp messages using whatsapp-web.js Node.js server
+
+    Several Node services (WHATSAPP_SERVICE_URLS, one WhatsApp session each)
+    form a pool: every recipient is routed to its home endpoint (see
+    rank_endpoints) and fails over to the next ready one. Each endpoint has
+    its own circuit breaker and rate limiter, so throughput grows with the
+    number of sessions.
     """
     
     def __init__(self):
-        self.base_url = getattr(settings, 'WHATSAPP_SERVICE_URL', 'http://localhost:3000')
+        self.urls = service_urls()
+        self.ready_ttl = getattr(settings, 'WHATSAPP_READY_TTL', 10)
+        self.session = get_session()
+        self.breakers = {url: get_breaker(url) for url in self.urls}
+        self.limiters = endpoint_limiters(self.urls)
+        # Seconds this instance has spent waiting for the shared rate limiter
+        self.rate_limit_wait = 0.0
+        self._wait_lock = threading.Lock()
+        if len(self.urls) > 1:
+            start_health_checks(self.urls)
     
-    def is_ready(self):
-        """Check if WhatsApp service is ready"""
-        try:
-            response = requests.get(f'{self.base_url}/status', timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('ready', False)
-            return False
-        except Exception as e:
-            print(f"Error checking WhatsApp service status: {e}")
+    @property
+    def circuit_open(self):
+        """True while sends are being short-circuited on every endpoint"""
+        return all(breaker.state == CircuitBreaker.OPEN for breaker in self.breakers.values())
+    
+    def retry_after(self):
+        """Seconds until some endpoint's circuit lets a trial request through"""
+        return min(breaker.retry_after() for breaker in self.breakers.values())
+    
+    def add_breaker_listener(self, callback):
+        """Register callback(url, old_state, new_state) on every endpoint's circuit breaker"""
+        for url, breaker in self.breakers.items():
+            breaker.add_listener(lambda old, new, url=url: callback(url, old, new))
+    
+    def _record_wait(self, wait):
+        if wait:
+            with self._wait_lock:
+                self.rate_limit_wait += wait
+            metrics.WHATSAPP_RATE_LIMIT_WAIT.inc(wait)
+    
+    def estimated_wait(self, count):
+        """Seconds before `count` more messages could start at the configured rate (for progress/ETA displays)"""
+        return estimated_wait(count, self.limiters)
+    
+    def _cache_readiness(self, url, ready):
+        _readiness[url] = (ready, time.monotonic())
+    
+    def invalidate_readiness(self, url=None):
+        """Forget the cached readiness so the next check hits /status"""
+        for url in [url] if url else self.urls:
+            _readiness.pop(url, None)
+    
+    def _cached_readiness(self, url):
+        """Readiness known without a request: False while the circuit is open, the cached /status answer, or None"""
+        if self.breakers[url].state == CircuitBreaker.OPEN:
             return False
+        cached = _readiness.get(url)
+        if cached and time.monotonic() - cached[1] < self.ready_ttl:
+            return cached[0]
+        return None
+    
+    def pick_endpoint(self, phone_number, exclude=()):
+        """
+        Endpoint that should send to this recipient
+        
+        The first available endpoint in the recipient's order (circuit not
+        open and not known to be down); when none is, the first one anyway,
+        so the attempt reports why it could not send.
+        
+        Returns:
+            str: Base URL, or None when every endpoint is in `exclude`
+        """
+        ranked = [url for url in rank_endpoints(self.urls, phone_number) if url not in exclude]
+        for url in ranked:
+            if self._cached_readiness(url) is not False:
+                return url
+        return ranked[0] if ranked else None
+    
+    def _qr_result(self, url, status_code, payload):
+        if status_code == 200:
+            # /qr reports authenticated only when the client is ready
+            self._cache_readiness(url, payload.get('authenticated', False))
+            return payload
+        self._cache_readiness(url, False)
+        return {'authenticated': False, 'message': 'Failed to get QR code'}
+    
+    def _transport_error(self, url, outcome):
+        """The request never got an answer: re-check /status next time and count a failure"""
+        self.invalidate_readiness(url)
+        self.breakers[url].record_failure()
+        message = CONNECTION_ERROR_MESSAGE if outcome == 'connection_error' else TIMEOUT_MESSAGE
+        return SendResult(False, message, outcome)
+    
+    def _send_result(self, url, status_code, payload):
+        """Map a /send response to its SendResult"""
+        breaker = self.breakers[url]
+        if status_code == 200:
+            breaker.record_success()
+            return SendResult(True, payload.get('message', 'Message sent successfully'), 'sent')
+        
+        # 503 means the client dropped its session; re-check /status next time
+        if status_code >= 500:
+            self.invalidate_readiness(url)
+            breaker.record_failure()
+            outcome = 'not_ready' if status_code == 503 else 'error'
+        else:
+            # 4xx (e.g. number not on WhatsApp) means the service itself is healthy
+            breaker.record_success()
+            outcome = 'not_registered' if status_code == 400 else 'error'
+        return SendResult(False, payload.get('error', 'Unknown error'), outcome)
+    
+    def _batch_results(self, url, status_code, payload, chunk):
+        """Map a /send-batch response (other than 404) to one SendResult per message of the chunk"""
+        breaker = self.breakers[url]
+        if status_code != 200:
+            if status_code >= 500:
+                self.invalidate_readiness(url)
+                breaker.record_failure()
+            else:
+                # 4xx (e.g. a payload too large) means the service itself is healthy
+                breaker.record_success()
+            error = payload.get('error', 'Unknown error')
+            outcome = 'not_ready' if status_code == 503 else 'error'
+            return [SendResult(False, error, outcome) for _ in chunk]
+        
+        results = []
+        for item in payload.get('results', []):
+            if item.get('success'):
+                results.append(SendResult(True, item.get('message', 'Message sent successfully'), 'sent'))
+            elif item.get('status') == 400:
+                results.append(SendResult(False, item.get('error', 'Unknown error'), 'not_registered'))
+            else:
+                results.append(SendResult(False, item.get('error', 'Unknown error'), 'error'))
+        
+        # The service should answer for every message; treat missing entries as failures
+        results.extend(SendResult(False, 'No result returned by WhatsApp service', 'error') for _ in chunk[len(results):])
+        
+        # One outcome per request, so a single bad batch cannot trip the breaker:
+        # it failed only if nothing went through and something errored
+        if all(result.outcome == 'error' for result in results):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return results
+    
+    def _route(self, messages, indices, down):
+        """Group message indices by endpoint, skipping endpoints in `down`"""
+        groups = defaultdict(list)
+        for index in indices:
+            # None once every endpoint failed this batch; the last result stands
+            url = self.pick_endpoint(messages[index][0], down)
+            if url is not None:
+                groups[url].append(index)
+        return groups
+    
+    def _circuit_open_rest(self, rest, results):
+        for index in rest:
+            results[index] = SendResult(False, CIRCUIT_OPEN_MESSAGE, 'circuit_open')
+        return rest
+    
+    def _failed_over(self, indices, start, batch_size, chunk_results, results):
+        """
+        Indices to hand to other endpoints when nothing in a chunk reached WhatsApp, else None
+        
+        Messages after the chunk keep its last result in case no endpoint takes them.
+        """
+        if not all(result.outcome in FAILOVER_OUTCOMES for result in chunk_results):
+            return None
+        rest = indices[start + batch_size:]
+        for index in rest:
+            results[index] = chunk_results[-1]
+        return indices[start:]
+    
+    def wait_for_slot(self, count=1, url=None):
+        """Block until the endpoint's rate limiter lets `count` more messages start"""
+        wait = self.limiters[url or self.urls[0]].acquire(count)
+        self._record_wait(wait)
+        return wait
     
-    def get_qr_code(self):
+    def is_ready(self, url=None):
+        """
+        Check if WhatsApp service is ready (cached for WHATSAPP_READY_TTL seconds)
+        
+        Args:
+            url: One endpoint; by default True when any endpoint is ready
+        """
+        if url is None:
+            return any(self.is_ready(url) for url in self.urls)
+        
+        cached = self._cached_readiness(url)
+        if cached is not None:
+            return cached
+        return check_status(self.session, url)
+    
+    def get_qr_code(self, url=None):
         """
         Get QR code for WhatsApp authentication
         
+        Args:
+            url: Endpoint whose session to link (default: the first one)
+        
         Returns:
             dict: {'authenticated': bool, 'qr': str (data URL), 'message': str}
         """
+        url = url or self.urls[0]
         try:
-            response = requests.get(f'{self.base_url}/qr', timeout=5)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {'authenticated': False, 'message': 'Failed to get QR code'}
+            response = self.session.get(f'{url}/qr', timeout=5)
+            return self._qr_result(url, response.status_code, _json(response))
         except requests.exceptions.ConnectionError:
+            self._cache_readiness(url, False)
             return {'authenticated': False, 'message': 'Cannot connect to WhatsApp service. Make sure the Node.js server is running.'}
         except Exception as e:
             return {'authenticated': False, 'message': f'Error: {str(e)}'}
@@ -51,35 +578,168 @@ class WhatsAppWebService:
         Returns:
             tuple: (success: bool, message: str)
         """
+        start = time.perf_counter()
+        result = self._send_one(phone_number, message)
+        metrics.observe_send('send', time.perf_counter() - start, [result.outcome])
+        return result.success, result.message
+    
+    def _send_one(self, phone_number, message):
+        """Send one message through the recipient's endpoint, failing over while nothing was sent"""
+        tried = set()
+        result = None
+        while True:
+            url = self.pick_endpoint(phone_number, tried)
+            if url is None:
+                return result
+            self.wait_for_slot(url=url)
+            result = self._post_one(url, phone_number, message)
+            if result.outcome not in FAILOVER_OUTCOMES:
+                return result
+            tried.add(url)
+    
+    def _post_one(self, url, phone_number, message, check_breaker=True):
+        """
+        Post one message to an endpoint's /send and return its SendResult
+        
+        Args:
+            check_breaker: False when the caller already holds the breaker's
+                           permission (the /send-batch fallback)
+        """
+        breaker = self.breakers[url]
+        if check_breaker and not breaker.allow_request():
+            return SendResult(False, CIRCUIT_OPEN_MESSAGE, 'circuit_open')
+        
         try:
             # Check if service is ready
-            if not self.is_ready():
-                return False, "WhatsApp service is not ready. Please make sure the service is running and authenticated."
-            
-            # Prepare request data
-            data = {
-                'phone_number': phone_number,
-                'message': message
-            }
+            if not self.is_ready(url):
+                breaker.record_failure()
+                return SendResult(False, NOT_READY_MESSAGE, 'not_ready')
             
-            # Send POST request
-            response = requests.post(
-                f'{self.base_url}/send',
-                json=data,
-                headers={'Content-Type': 'application/json'},
+            response = self.session.post(
+                f'{url}/send',
+                json={'phone_number': phone_number, 'message': message},
                 timeout=120  # Increased timeout to 2 minutes
             )
+            return self._send_result(url, response.status_code, _json(response))
+        except requests.exceptions.ConnectionError:
+            return self._transport_error(url, 'connection_error')
+        except requests.exceptions.Timeout:
+            return self._transport_error(url, 'timeout')
+        except Exception as e:
+            breaker.record_failure()
+            return SendResult(False, f"Error sending WhatsApp message: {str(e)}", 'error')
+    
+    def send_batch(self, messages):
+        """
+        Send many WhatsApp messages through the /send-batch endpoint
+        
+        Messages are grouped by their recipient's endpoint and the groups are
+        sent in parallel, in chunks of WHATSAPP_BATCH_SIZE; the Node service
+        paces the sends inside each chunk, and each chunk first waits for the
+        endpoint's rate limiter (WHATSAPP_RATE_LIMIT). When an endpoint turns
+        out to be down before a chunk was handed to it, the rest of its group
+        moves to the recipients' next endpoints. Messages no endpoint could
+        take keep the last endpoint's result ('circuit_open', 'not_ready' or
+        'connection_error'); they were not attempted.
+        
+        Args:
+            messages: List of (phone_number, message) tuples
             
-            if response.status_code == 200:
-                result = response.json()
-                return True, result.get('message', 'Message sent successfully')
+        Returns:
+            list: One SendResult per input message, in the same order
+        """
+        results = [None] * len(messages)
+        down = set()
+        todo = list(range(len(messages)))
+        
+        while todo:
+            jobs = [(url, indices, messages, results) for url, indices in self._route(messages, todo, down).items()]
+            if len(jobs) > 1:
+                with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                    leftovers = list(executor.map(lambda job: self._send_group(*job), jobs))
             else:
-                error_data = response.json()
-                return False, error_data.get('error', 'Unknown error')
-                
+                leftovers = [self._send_group(*job) for job in jobs]
+            
+            todo = []
+            for (url, _, _, _), leftover in zip(jobs, leftovers):
+                if leftover:
+                    down.add(url)
+                    todo.extend(leftover)
+        
+        # Counted once the results are final; failed-over messages were re-sent
+        metrics.count_outcomes(result.outcome for result in results)
+        return results
+    
+    def _send_group(self, url, indices, messages, results):
+        """
+        Send the messages at `indices` through one endpoint, filling `results`
+        
+        Returns:
+            list: Indices left unsent because the endpoint went down
+        """
+        batch_size = getattr(settings, 'WHATSAPP_BATCH_SIZE', 25)
+        
+        for start in range(0, len(indices), batch_size):
+            chunk_indices = indices[start:start + batch_size]
+            chunk = [messages[index] for index in chunk_indices]
+            
+            if not self.breakers[url].allow_request():
+                return self._circuit_open_rest(indices[start:], results)
+            
+            # The whole chunk is reserved; the Node service paces the sends inside it
+            self.wait_for_slot(len(chunk), url)
+            chunk_start = time.perf_counter()
+            chunk_results = self._send_chunk(url, chunk)
+            metrics.observe_send('send-batch', time.perf_counter() - chunk_start)
+            for index, result in zip(chunk_indices, chunk_results):
+                results[index] = result
+            
+            # Nothing in this chunk reached WhatsApp: hand the rest to other endpoints
+            leftover = self._failed_over(indices, start, batch_size, chunk_results, results)
+            if leftover:
+                return leftover
+        
+        return []
+    
+    def _send_chunk(self, url, chunk):
+        """Post one chunk to an endpoint's /send-batch and map the per-item results"""
+        if not self.is_ready(url):
+            self.breakers[url].record_failure()
+            return [SendResult(False, NOT_READY_MESSAGE, 'not_ready') for _ in chunk]
+        
+        data = {
+            'messages': [
+                {'phone_number': phone_number, 'message': message}
+                for phone_number, message in chunk
+            ]
+        }
+        
+        try:
+            response = self.session.post(
+                f'{url}/send-batch',
+                json=data,
+                timeout=max(120, 15 * len(chunk))  # the Node side sends one by one
+            )
         except requests.exceptions.ConnectionError:
-            return False, "Cannot connect to WhatsApp service. Make sure the Node.js server is running."
+            return [self._transport_error(url, 'connection_error')] * len(chunk)
         except requests.exceptions.Timeout:
-            return False, "Request timeout. WhatsApp service took too long to respond."
-        except Exception as e:
-            return False, f"Error sending WhatsApp message: {str(e)}"
+            return [self._transport_error(url, 'timeout')] * len(chunk)
+        except requests.exceptions.RequestException as e:
+            self.breakers[url].record_failure()
+            return [SendResult(False, f"Error sending WhatsApp message: {str(e)}", 'error')] * len(chunk)
+        
+        if response.status_code == 404:
+            # Older Node service without /send-batch: fall back to one request per message.
+            # _send_group already took the breaker's permission (possibly its one
+            # half-open trial), so the fallback must not ask again; it stops once
+            # a failed /send opens the circuit
+            self.breakers[url].record_success()
+            results = []
+            for phone_number, message in chunk:
+                if self.breakers[url].state == CircuitBreaker.OPEN:
+                    results.append(SendResult(False, CIRCUIT_OPEN_MESSAGE, 'circuit_open'))
+                else:
+                    results.append(self._post_one(url, phone_number, message, check_breaker=False))
+            return results
+        
+        return self._batch_results(url, response.status_code, _json(response), chunk)
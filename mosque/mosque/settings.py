@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dashboard.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'dashboard.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'mosque.urls'
@@ -137,8 +139,72 @@ LOCALE_PATHS = [
 STATIC_URL = 'static/'
 
 
+# Cache
+# Shared between worker processes so signal-based invalidation reaches all of them
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', '/tmp/mosque_cache'),
+    }
+}
+
+LIST_PAGE_SIZE = 50  # rows per page on the mosque, caller and schedule lists
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per database round trip by the CSV/XLSX exports
+
+OUTBOX_STATS_TTL = 5  # seconds the home page outbox counters may lag behind
+# One combined reminder per imam instead of one per schedule (daily and weekly broadcasts)
+COALESCE_REMINDERS = os.environ.get('COALESCE_REMINDERS', '1') == '1'
+# Failed sends are retried after ~BASE, 2x, 4x ... seconds (capped at MAX, with jitter);
+# after OUTBOX_MAX_ATTEMPTS attempts they become dead letters on the dashboard
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_BASE_DELAY = int(os.environ.get('OUTBOX_RETRY_BASE_DELAY', 60))
+OUTBOX_RETRY_MAX_DELAY = int(os.environ.get('OUTBOX_RETRY_MAX_DELAY', 3600))
+# Seconds after which a delivery claimed by a run that never sent or queued it may be retried
+DELIVERY_CLAIM_TIMEOUT = int(os.environ.get('DELIVERY_CLAIM_TIMEOUT', 600))
+
+
+# Request timing (dashboard.middleware.RequestTimingMiddleware)
+REQUEST_TIME_BUDGET_MS = int(os.environ.get('REQUEST_TIME_BUDGET_MS', 500))  # slower requests log their full SQL list
+
+# On-demand profiling (?profile=1 for staff users, send_daily_reminders --profile)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/mosque_profiles')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'dashboard': {
+            'handlers': ['console'],
+            'level': os.environ.get('DASHBOARD_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
 # WhatsApp Web Service Settings
 WHATSAPP_SERVICE_URL = os.environ.get('WHATSAPP_SERVICE_URL', 'http://localhost:3000')
+# Comma-separated Node services, one WhatsApp session each; empty means WHATSAPP_SERVICE_URL alone
+WHATSAPP_SERVICE_URLS = [url.strip() for url in os.environ.get('WHATSAPP_SERVICE_URLS', '').split(',') if url.strip()]
+WHATSAPP_HEALTH_INTERVAL = int(os.environ.get('WHATSAPP_HEALTH_INTERVAL', 5))  # seconds between background status/QR polls; 0 = poll on page load
+WHATSAPP_POOL_SIZE = int(os.environ.get('WHATSAPP_POOL_SIZE', 10))  # keep-alive connections per host
+WHATSAPP_READY_TTL = int(os.environ.get('WHATSAPP_READY_TTL', 10))  # seconds to trust a /status result
+WHATSAPP_BREAKER_THRESHOLD = int(os.environ.get('WHATSAPP_BREAKER_THRESHOLD', 5))  # consecutive failures before failing fast
+WHATSAPP_BREAKER_RESET = int(os.environ.get('WHATSAPP_BREAKER_RESET', 30))  # seconds before a trial request is allowed
+# Send-rate limit per WhatsApp session, shared by all processes using the same state file (0 disables it)
+WHATSAPP_RATE_LIMIT = float(os.environ.get('WHATSAPP_RATE_LIMIT', 1))  # messages per second
+WHATSAPP_RATE_BURST = int(os.environ.get('WHATSAPP_RATE_BURST', 5))  # messages that may start back to back after a pause
+WHATSAPP_RATE_LIMIT_FILE = os.environ.get('WHATSAPP_RATE_LIMIT_FILE', '/tmp/mosque_whatsapp_rate')
+WHATSAPP_BATCH_SIZE = int(os.environ.get('WHATSAPP_BATCH_SIZE', 25))  # messages per /send-batch request
+
+# Live broadcast progress (Server-Sent Events)
+BROADCAST_POLL_INTERVAL = float(os.environ.get('BROADCAST_POLL_INTERVAL', 2))  # seconds between progress checks
+BROADCAST_STREAM_TIMEOUT = int(os.environ.get('BROADCAST_STREAM_TIMEOUT', 300))  # seconds before an ASGI stream ends and the browser reconnects
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -79,6 +79,38 @@ process.on('SIGTERM', async () => {
 // Initialize the client
 client.initialize();
 
+// Delay between messages inside a /send-batch request (can be overridden per request)
+const BATCH_SEND_DELAY_MS = parseInt(process.env.BATCH_SEND_DELAY_MS || '1000', 10);
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Send one message and describe the outcome as { status, body }
+async function sendOne(phone_number, message) {
+    if (!phone_number || !message) {
+        return { status: 400, body: { error: 'phone_number and message are required' } };
+    }
+    
+    if (!isReady) {
+        return { status: 503, body: { error: 'WhatsApp client is not ready. Please authenticate first.' } };
+    }
+    
+    // Format phone number (remove any non-digits and add @c.us)
+    const formattedNumber = phone_number.replace(/\D/g, '') + '@c.us';
+    
+    try {
+        await client.sendMessage(formattedNumber, message);
+        return { status: 200, body: { success: true, message: `Message sent to ${phone_number}` } };
+    } catch (sendError) {
+        console.error('Send error:', sendError.message);
+        
+        // Check if it's a "No LID for user" error
+        if (sendError.message.includes('No LID for user')) {
+            return { status: 400, body: { error: `رقم ${phone_number} غير مسجل على واتساب أو غير صحيح` } };
+        }
+        return { status: 500, body: { error: sendError.message } };
+    }
+}
+
 // Create HTTP server to handle message requests
 const server = http.createServer(async (req, res) => {
     // Set CORS headers
@@ -104,11 +136,27 @@ const server = http.createServer(async (req, res) => {
                 const data = JSON.parse(body);
                 const { phone_number, message } = data;
                 
-                if (!phone_number || !message) {
-                    res.writeHead(400, { 'Content-Type': 'application/json' });
-                    res.end(JSON.stringify({ error: 'phone_number and message are required' }));
-                    return;
-                }
+                const result = await sendOne(phone_number, message);
+                res.writeHead(result.status, { 'Content-Type': 'application/json' });
+                res.end(JSON.stringify(result.body));
+            } catch (error) {
+                console.error('Error:', error);
+                res.writeHead(500, { 'Content-Type': 'application/json' });
+                res.end(JSON.stringify({ error: error.message }));
+            }
+        });
+    } else if (req.method === 'POST' && req.url === '/send-batch') {
+        let body = '';
+        
+        req.on('data', chunk => {
+            body += chunk.toString();
+        });
+        
+        req.on('end', async () => {
+            try {
+                const data = JSON.parse(body);
+                const messages = Array.isArray(data.messages) ? data.messages : [];
+                const delayMs = Number.isInteger(data.delay_ms) ? data.delay_ms : BATCH_SEND_DELAY_MS;
                 
                 if (!isReady) {
                     res.writeHead(503, { 'Content-Type': 'application/json' });
@@ -116,32 +164,27 @@ const server = http.createServer(async (req, res) => {
                     return;
                 }
                 
-                // Format phone number (remove any non-digits and add @c.us)
-                const formattedNumber = phone_number.replace(/\D/g, '') + '@c.us';
-                
-                // Send message
-                try {
-                    await client.sendMessage(formattedNumber, message);
-                    
-                    res.writeHead(200, { 'Content-Type': 'application/json' });
-                    res.end(JSON.stringify({ 
-                        success: true, 
-                        message: `Message sent to ${phone_number}` 
-                    }));
-                } catch (sendError) {
-                    console.error('Send error:', sendError.message);
-                    
-                    // Check if it's a "No LID for user" error
-                    if (sendError.message.includes('No LID for user')) {
-                        res.writeHead(400, { 'Content-Type': 'application/json' });
-                        res.end(JSON.stringify({ 
-                            error: `رقم ${phone_number} غير مسجل على واتساب أو غير صحيح`
-                        }));
-                    } else {
-                        res.writeHead(500, { 'Content-Type': 'application/json' });
-                        res.end(JSON.stringify({ error: sendError.message }));
+                // Send one after another, pausing between messages
+                const results = [];
+                for (let i = 0; i < messages.length; i++) {
+                    const { phone_number, message } = messages[i] || {};
+                    const result = await sendOne(phone_number, message);
+                    // Invalid items are reported as 422 so 400 keeps meaning "not on WhatsApp"
+                    const status = (result.status === 400 && (!phone_number || !message)) ? 422 : result.status;
+                    results.push({
+                        phone_number,
+                        status,
+                        success: status === 200,
+                        message: result.body.message,
+                        error: result.body.error,
+                    });
+                    if (delayMs > 0 && i < messages.length - 1) {
+                        await sleep(delayMs);
                     }
                 }
+                
+                res.writeHead(200, { 'Content-Type': 'application/json' });
+                res.end(JSON.stringify({ results }));
             } catch (error) {
                 console.error('Error:', error);
                 res.writeHead(500, { 'Content-Type': 'application/json' });
@@ -192,6 +235,7 @@ server.listen(PORT, () => {
     console.log(`WhatsApp service running on http://localhost:${PORT}`);
     console.log('Endpoints:');
     console.log('  POST /send - Send WhatsApp message');
+    console.log('  POST /send-batch - Send many WhatsApp messages in one request');
     console.log('  GET /status - Check service status');
     console.log('  GET /qr - Get QR code for authentication');
 });